@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def ensure_search_index(sender, using, **kwargs):
+    """
+    SQLite rebuilds a table on most ALTERs, which silently drops the search
+    triggers on manager_product; put them back after every migrate.
+    """
+    from django.db import connections
+    from . import search
+
+    connection = connections[using]
+    if 'manager_product' in connection.introspection.table_names():
+        search.install(connection)
 
 
 class ManagerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'manager'
+
+    def ready(self):
+        from .autocomplete import product_index
+        from .models import Invoice, Product
+        from .reports import mark_day_stale
+
+        post_migrate.connect(ensure_search_index, sender=self)
+        post_save.connect(product_index.invalidate, sender=Product, dispatch_uid='product_index_save')
+        post_delete.connect(product_index.invalidate, sender=Product, dispatch_uid='product_index_delete')
+        post_delete.connect(mark_day_stale, sender=Invoice, dispatch_uid='report_rollups_invoice_delete')
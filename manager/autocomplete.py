@@ -0,0 +1,85 @@
+# autocomplete.py
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Product
+
+
+def _words(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+class ProductPrefixIndex:
+    """
+    In-process prefix index over product names for the typeahead endpoint.
+
+    Every word of every product name is kept in one sorted array of
+    (word, pk) pairs, so a prefix lookup is a bisect plus a short scan.
+    Product save/delete signals mark the index stale and the next lookup
+    rebuilds it with a single query. Other processes do not see those
+    signals, so the index is also rebuilt once it is older than
+    settings.PRODUCT_AUTOCOMPLETE_MAX_AGE seconds (bulk writes such as
+    stock imports and seeding do not send signals either).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (sorted (word, pk) entries, {pk: product dict}), swapped as one
+        self.state = ([], {})
+        self.built_at = None
+        # Bumped by every invalidation, so a change made during a build is not lost
+        self.generation = 0
+        self.built_generation = None
+
+    def invalidate(self, **kwargs):
+        self.generation += 1
+
+    def is_stale(self):
+        return (
+            self.built_generation != self.generation
+            or time.monotonic() - self.built_at > settings.PRODUCT_AUTOCOMPLETE_MAX_AGE
+        )
+
+    def build(self):
+        generation = self.generation
+        products, entries = {}, []
+        for pk, name, category, price in Product.objects.values_list('pk', 'name', 'category', 'price'):
+            products[pk] = {'id': pk, 'name': name, 'category': category, 'price': str(price)}
+            entries.extend((word, pk) for word in set(_words(name)))
+        entries.sort()
+        with self.lock:
+            self.state = (entries, products)
+            self.built_at = time.monotonic()
+            self.built_generation = generation
+
+    @staticmethod
+    def matching(entries, prefix):
+        """pks of products with a name word starting with prefix"""
+        found = set()
+        index = bisect_left(entries, (prefix,))
+        while index < len(entries) and entries[index][0].startswith(prefix):
+            found.add(entries[index][1])
+            index += 1
+        return found
+
+    def search(self, query, limit=10):
+        """Products whose name words start with every term of query, best matches first"""
+        if self.is_stale():
+            self.build()
+        terms = _words(query)
+        if not terms:
+            return []
+        entries, products = self.state
+
+        pks = set.intersection(*(self.matching(entries, term) for term in terms))
+        query = ' '.join(terms)
+        results = [products[pk] for pk in pks]
+        results.sort(key=lambda item: (not item['name'].lower().startswith(query), item['name'].lower(), item['id']))
+        return results[:limit]
+
+
+product_index = ProductPrefixIndex()
@@ -0,0 +1,204 @@
+# exports.py
+import csv
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+
+from .models import Client, Invoice, InvoiceItem, WarehouseProduct
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_FORMAT = "%Y-%m-%d"
+
+
+class Echo:
+    """File-like object whose write() hands the CSV line straight back"""
+    def write(self, value):
+        return value
+
+
+class CSVExport:
+    """
+    One CSV export: a header row plus a values_list() query that is read in
+    chunks, so memory stays flat no matter how large the table is.
+    Subclasses set name, filename, header and fields and implement get_queryset().
+    """
+    name = None
+    filename = None
+    header = []
+    fields = []
+    param_names = []
+    chunk_size = 2000
+
+    def __init__(self, params=None):
+        params = params or {}
+        self.params = {
+            key: params.get(key) for key in self.param_names if params.get(key)
+        }
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    def format_row(self, row):
+        return row
+
+    def rows(self):
+        yield self.header
+        queryset = self.get_queryset().values_list(*self.fields)
+        for row in queryset.iterator(chunk_size=self.chunk_size):
+            yield self.format_row(row)
+
+    def iter_lines(self):
+        writer = csv.writer(Echo())
+        for row in self.rows():
+            yield writer.writerow(row)
+
+    def write_to(self, file):
+        """Write the whole export to an open text file; returns the number of data rows"""
+        writer = csv.writer(file)
+        count = -1
+        for count, row in enumerate(self.rows()):
+            writer.writerow(row)
+        return count
+
+    def streaming_response(self):
+        response = StreamingHttpResponse(self.iter_lines(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        return response
+
+
+def _format_datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value else ''
+
+
+def _format_date(value):
+    return value.strftime(DATE_FORMAT) if value else ''
+
+
+class InvoiceFilterMixin:
+    """Applies the same status/date filters as InvoiceListView"""
+    invoice_lookup = ''
+    param_names = ['status', 'date_from', 'date_to']
+
+    def filter_invoices(self, queryset):
+        prefix = self.invoice_lookup
+        status = self.params.get('status')
+        date_from = self.params.get('date_from')
+        date_to = self.params.get('date_to')
+        if status:
+            queryset = queryset.filter(**{f'{prefix}status': status})
+        if date_from:
+            queryset = queryset.filter(**{f'{prefix}date_created__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{prefix}date_created__lte': date_to})
+        return queryset
+
+
+class ClientExport(CSVExport):
+    name = 'clients'
+    filename = 'clients_export.csv'
+    header = ['Name', 'Address', 'Phone', 'Email', 'Created At', 'Updated At']
+    fields = ['name', 'address', 'phone', 'email', 'created_at', 'updated_at']
+
+    def get_queryset(self):
+        return Client.objects.order_by('name')
+
+    def format_row(self, row):
+        name, address, phone, email, created_at, updated_at = row
+        return [
+            name,
+            address,
+            phone,
+            email or '',
+            _format_datetime(created_at),
+            _format_datetime(updated_at),
+        ]
+
+
+class InvoiceExport(InvoiceFilterMixin, CSVExport):
+    name = 'invoices'
+    filename = 'invoices_export.csv'
+    header = [
+        'Invoice Number', 'Client', 'Assigned To', 'Status', 'Date Created', 'Due Date',
+        'Subtotal', 'Tax Percentage', 'Discount', 'Total', 'Amount Paid', 'Balance Due'
+    ]
+    fields = [
+        'number', 'client__name', 'assigned_to__username', 'status', 'date_created', 'date_due',
+        'calculated_subtotal', 'tax_percentage', 'discount_amount', 'calculated_total', 'amount_paid'
+    ]
+
+    def get_queryset(self):
+        return self.filter_invoices(Invoice.objects.order_by('number'))
+
+    def format_row(self, row):
+        (number, client, assigned_to, status, date_created, date_due,
+         subtotal, tax_percentage, discount, total, amount_paid) = row
+        return [
+            number,
+            client,
+            assigned_to or '',
+            status,
+            _format_datetime(date_created),
+            _format_date(date_due),
+            subtotal,
+            tax_percentage,
+            discount,
+            total,
+            amount_paid,
+            (Decimal(total) - Decimal(amount_paid)).quantize(Decimal('0.01')),
+        ]
+
+
+class InvoiceItemExport(InvoiceFilterMixin, CSVExport):
+    name = 'invoice_items'
+    filename = 'invoice_items_export.csv'
+    invoice_lookup = 'invoice__'
+    header = [
+        'Invoice Number', 'Invoice Date', 'Client', 'Product', 'Category',
+        'Unit Price', 'Quantity', 'Line Total'
+    ]
+    fields = [
+        'invoice_id', 'invoice__date_created', 'invoice__client__name', 'product__name',
+        'product__category', 'unit_price', 'quantity'
+    ]
+
+    def get_queryset(self):
+        return self.filter_invoices(InvoiceItem.objects.order_by('invoice_id', 'pk'))
+
+    def format_row(self, row):
+        invoice_id, date_created, client, product, category, unit_price, quantity = row
+        return [
+            invoice_id,
+            _format_datetime(date_created),
+            client,
+            product,
+            category,
+            unit_price,
+            quantity,
+            unit_price * quantity,
+        ]
+
+
+class WarehouseStockExport(CSVExport):
+    name = 'warehouse_stock'
+    filename = 'warehouse_stock_export.csv'
+    header = ['Warehouse', 'Product', 'Category', 'Quantity', 'Unit Price', 'Stock Value']
+    fields = ['warehouse__name', 'product__name', 'product__category', 'quantity', 'product__price']
+    param_names = ['warehouse']
+
+    def get_queryset(self):
+        queryset = WarehouseProduct.objects.order_by('warehouse__name', 'product__name')
+        warehouse = self.params.get('warehouse')
+        if warehouse and str(warehouse).isdigit():
+            queryset = queryset.filter(warehouse_id=warehouse)
+        return queryset
+
+    def format_row(self, row):
+        warehouse, product, category, quantity, price = row
+        return [warehouse, product, category, quantity, price, price * quantity]
+
+
+EXPORTS = {
+    export.name: export
+    for export in (ClientExport, InvoiceExport, InvoiceItemExport, WarehouseStockExport)
+}
@@ -2,13 +2,14 @@
 import django_filters
 from django import forms
 from .models import Product
+from .search import SearchFilterMixin
 
-class ProductFilter(django_filters.FilterSet):
+class ProductFilter(SearchFilterMixin, django_filters.FilterSet):
     name = django_filters.CharFilter(
-        lookup_expr='icontains', 
+        method='filter_search',
         label='',
         widget=forms.TextInput(attrs={
-            'placeholder': 'Search by name...',
+            'placeholder': 'Search products...',
             'class': 'form-control'
         })
     )
@@ -42,11 +43,28 @@ class ProductFilter(django_filters.FilterSet):
         widget=forms.Select  # Note: Passing the class, not an instance
     )
     
+    STOCK_IN = 'in_stock'
+    STOCK_LOW = 'low'
+    STOCK_OUT = 'out'
+
+    stock = django_filters.ChoiceFilter(
+        choices=[
+            (STOCK_IN, 'In Stock'),
+            (STOCK_LOW, 'Low Stock'),
+            (STOCK_OUT, 'Out of Stock'),
+        ],
+        method='filter_stock',
+        label='',
+        empty_label='Any Stock',
+        widget=forms.Select  # Note: Passing the class, not an instance
+    )
+
     ordering = django_filters.OrderingFilter(
         fields=(
             ('name', 'name'),
             ('price', 'price'),
             ('created_at', 'last_added'),
+            ('stock_quantity', 'stock'),
         ),
         field_labels={
             'name': 'Name (A-Z)',
@@ -55,12 +73,31 @@ class ProductFilter(django_filters.FilterSet):
             '-price': 'Price (High to Low)',
             'created_at': 'Oldest First',
             '-created_at': 'Newest First',
+            'stock_quantity': 'Low Stock First',
+            '-stock_quantity': 'High Stock First',
         },
         label='Sort by',
         empty_label='Default',
         widget=forms.Select  # Note: Passing the class, not an instance
     )
 
+    def filter_queryset(self, queryset):
+        # Stock filtering and sorting read the annotated total, so make sure
+        # it is present even when the caller passed a plain queryset
+        return super().filter_queryset(queryset.with_stock_totals())
+
+    def filter_stock(self, queryset, name, value):
+        if value == self.STOCK_OUT:
+            return queryset.filter(stock_quantity=0)
+        if value == self.STOCK_LOW:
+            return queryset.filter(
+                stock_quantity__gt=0,
+                stock_quantity__lte=Product.LOW_STOCK_THRESHOLD
+            )
+        if value == self.STOCK_IN:
+            return queryset.filter(stock_quantity__gt=0)
+        return queryset
+
     class Meta:
         model = Product
         fields = []
\ No newline at end of file
@@ -55,6 +55,29 @@ class WarehouseProductFormAdd(forms.ModelForm):
         
         
         
+class StockImportForm(forms.Form):
+    MODE_CHOICES = [
+        ('set', 'Set quantity'),
+        ('add', 'Add to quantity'),
+    ]
+
+    file = forms.FileField(
+        label="Stock sheet",
+        help_text="CSV (or XLSX) with columns: warehouse, product, quantity and optionally mode",
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    mode = forms.ChoiceField(
+        choices=MODE_CHOICES,
+        initial='set',
+        help_text="Used for rows without a mode value",
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        label="Validate only (don't save)"
+    )
+        
+        
 class ClientForm(forms.ModelForm):
     class Meta:
         model = Client
@@ -75,7 +98,10 @@ class ClientForm(forms.ModelForm):
 
 
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from .models import Invoice, Product , InvoiceItem
 from django.contrib.auth import get_user_model  # Add this import
 
@@ -100,12 +126,63 @@ class InvoiceForm(forms.ModelForm):
             if not self.instance.pk:  # Only for new invoices
                 self.initial['assigned_to'] = self.user
 
+class ProductAutocompleteSelect(forms.Select):
+    """
+    Product <select> that renders only the chosen product instead of the
+    whole catalog; a search box next to it loads matches from the
+    product_autocomplete endpoint as the user types.
+    """
+    # pk -> Product map shared by the formset; when it has the chosen products
+    # the widget renders without a query
+    products = None
+
+    def selected_products(self, selected):
+        if self.products is not None:
+            found = [self.products.get(int(pk)) for pk in selected if pk.isdigit()]
+            if len(found) == len(selected) and all(found):
+                return found
+        return self.choices.queryset.filter(pk__in=selected).only('pk', 'name', 'category', 'price')
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [str(v) for v in value if v not in (None, '')]
+        options = [self.create_option(name, '', self.choices.field.empty_label or '', not selected, 0)]
+        if selected:
+            for index, product in enumerate(self.selected_products(selected), start=1):
+                option = self.create_option(name, str(product.pk), str(product), True, index)
+                option['attrs']['data-price'] = str(product.price)
+                options.append(option)
+        return [(None, options, 0)]
+
+    def render(self, name, value, attrs=None, renderer=None):
+        search = format_html(
+            '<input type="search" name="{}_search" class="form-control form-control-sm mb-1 product-search" '
+            'placeholder="Search products..." autocomplete="off" data-autocomplete-url="{}">',
+            name, reverse('product_autocomplete')
+        )
+        return search + super().render(name, value, attrs, renderer)
+
+
+class ProductChoiceField(forms.ModelChoiceField):
+    """Resolves the submitted product from the formset's shared map before querying"""
+    products = None
+
+    def to_python(self, value):
+        if value in self.empty_values or self.products is None:
+            return super().to_python(value)
+        try:
+            product = self.products.get(int(value))
+        except (TypeError, ValueError):
+            product = None
+        return product if product is not None else super().to_python(value)
+
+
 class InvoiceItemForm(forms.ModelForm):
     class Meta:
         model = InvoiceItem
         fields = ['product', 'unit_price', 'quantity']
+        field_classes = {'product': ProductChoiceField}
         widgets = {
-            'product': forms.Select(attrs={'class': 'form-control product-select'}),
+            'product': ProductAutocompleteSelect(attrs={'class': 'form-control product-select'}),
             'unit_price': forms.NumberInput(attrs={
                 'class': 'form-control unit-price',
                 'min': '0.01',
@@ -117,16 +194,53 @@ class InvoiceItemForm(forms.ModelForm):
             })
         }
         
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, products=None, **kwargs):
         super().__init__(*args, **kwargs)
-        if 'product' in self.initial:
-            product = Product.objects.get(pk=self.initial['product'])
-            self.fields['unit_price'].initial = product.price
+        # products is the pk -> Product map shared by BaseInvoiceItemFormSet
+        if products is not None:
+            self.fields['product'].products = products
+            self.fields['product'].widget.products = products
+        if self.initial.get('product'):
+            product = (products or {}).get(self.initial['product'])
+            if product is None:
+                product = Product.objects.filter(pk=self.initial['product']).only('price').first()
+            if product is not None:
+                self.fields['unit_price'].initial = product.price
+
+
+class BaseInvoiceItemFormSet(BaseInlineFormSet):
+    """
+    Loads every product the item forms refer to (existing lines, initial
+    data and submitted values) with one query, and hands the same
+    pk -> Product map to each form for labels, prices and validation.
+    """
+    @cached_property
+    def products(self):
+        pks = set()
+        if self.is_bound:
+            for index in range(self.total_form_count()):
+                value = self.data.get(self.add_prefix(index) + '-product')
+                if value and str(value).isdigit():
+                    pks.add(int(value))
+        if self.instance.pk:
+            pks.update(item.product_id for item in self.get_queryset())
+        pks.update(
+            int(initial['product']) for initial in (self.initial_extra or [])
+            if str(initial.get('product') or '').isdigit()
+        )
+        return Product.objects.in_bulk(pks) if pks else {}
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['products'] = self.products
+        return kwargs
+
 
 InvoiceItemFormSet = inlineformset_factory(
     Invoice,
     InvoiceItem,
     form=InvoiceItemForm,
+    formset=BaseInvoiceItemFormSet,
     extra=1,
     can_delete=True
 )
@@ -0,0 +1,163 @@
+# images.py
+"""
+Responsive derivatives of product images.
+
+Every Product.main_image and ProductImage.image is resized to a few fixed
+widths and saved as WebP and JPEG under MEDIA_ROOT/derivatives/. The
+work happens outside the request: an upload only marks the row pending
+(see Product.save / ProductImage.save) and the run_image_worker command
+generates the files, then marks the row done. Until then templates fall
+back to the original upload.
+
+Derivative names are built from the original's full storage name,
+extension included, so a new upload never reuses the files of the image
+it replaced or of another upload with the same stem.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+DERIVATIVES_DIR = 'derivatives'
+
+# Name -> maximum width in pixels; images are never upscaled
+SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'detail': 1200,
+}
+
+# Format -> (Pillow format, extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Sent once a row's derivatives are written, since the worker saves with update()
+derivatives_ready = Signal()
+
+
+def derivative_name(name, size, fmt):
+    # Keep the original extension: beam.png and beam.jpg must not share files
+    return f"{DERIVATIVES_DIR}/{size}/{name}.{FORMATS[fmt][1]}"
+
+
+def _resize(image, width):
+    if image.width <= width:
+        return image.copy()
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def _encode(image, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        if 'A' in image.getbands():
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate(fieldfile):
+    """Write every size and format of fieldfile's image; returns the derivative names"""
+    storage = fieldfile.storage
+    with fieldfile.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+
+    names = []
+    for size, width in SIZES.items():
+        resized = _resize(image, width)
+        for fmt in FORMATS:
+            name = derivative_name(fieldfile.name, size, fmt)
+            # storage.save() picks a new name when the file exists; overwrite instead
+            if storage.exists(name):
+                storage.delete(name)
+            names.append(storage.save(name, ContentFile(_encode(resized, fmt))))
+    return names
+
+
+def exists(fieldfile):
+    """True if every derivative of fieldfile is in storage"""
+    return all(
+        fieldfile.storage.exists(derivative_name(fieldfile.name, size, fmt))
+        for size in SIZES for fmt in FORMATS
+    )
+
+
+class Derivatives:
+    """
+    Template helper for one image field. Attributes named after SIZES map
+    each format to a URL, e.g. {{ images.card.webp }}; srcset maps each
+    format to a srcset value. Both fall back to the original when the
+    derivatives are not ready yet.
+    """
+
+    def __init__(self, fieldfile, ready):
+        self.fieldfile = fieldfile
+        self.ready = bool(fieldfile) and ready
+
+    @property
+    def original(self):
+        return self.fieldfile.url if self.fieldfile else ''
+
+    def url(self, size, fmt):
+        if not self.ready:
+            return self.original
+        return self.fieldfile.storage.url(derivative_name(self.fieldfile.name, size, fmt))
+
+    def __getattr__(self, size):
+        if size not in SIZES:
+            raise AttributeError(size)
+        return {fmt: self.url(size, fmt) for fmt in FORMATS}
+
+    @property
+    def srcset(self):
+        if not self.ready:
+            return {fmt: '' for fmt in FORMATS}
+        return {
+            fmt: ', '.join(f"{self.url(size, fmt)} {width}w" for size, width in SIZES.items())
+            for fmt in FORMATS
+        }
+
+
+def sources():
+    """(model, image field, status field) for every model with derivatives"""
+    from .models import Product, ProductImage
+    return [
+        (Product, 'main_image', 'main_image_status'),
+        (ProductImage, 'image', 'image_status'),
+    ]
+
+
+def process(instance, field, status_field):
+    """
+    Generate derivatives for one row and record the outcome. The status is
+    only written if the image is still the one processed, so a re-upload in
+    the meantime stays pending. Returns (status, error).
+    """
+    from .models import DerivativeStatus
+
+    fieldfile = getattr(instance, field)
+    try:
+        generate(fieldfile)
+    except Exception as exc:
+        status, error = DerivativeStatus.FAILED, str(exc)
+    else:
+        status, error = DerivativeStatus.DONE, None
+    updated = type(instance).objects.filter(pk=instance.pk, **{field: fieldfile.name}).update(
+        **{status_field: status}
+    )
+    if updated and status == DerivativeStatus.DONE:
+        setattr(instance, status_field, status)
+        derivatives_ready.send(sender=type(instance), instance=instance)
+    return status, error
@@ -0,0 +1,237 @@
+# imports.py
+import csv
+import io
+import os
+import zipfile
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Product, StockMovement, Warehouse, WarehouseProduct
+
+
+class StockImportError(Exception):
+    """Raised when a stock sheet cannot be read at all"""
+
+
+class StockImport:
+    """
+    Bulk stock-level import from a sheet with the columns
+    warehouse, product, quantity and (optionally) mode.
+
+    Warehouses and products may be given by id or by name. The whole sheet is
+    validated in memory first; if any row is invalid nothing is written.
+    Otherwise the changes are applied with bulk_create/bulk_update inside
+    one transaction.
+    """
+    MODE_SET = 'set'
+    MODE_ADD = 'add'
+    MODES = (MODE_SET, MODE_ADD)
+
+    REQUIRED_COLUMNS = ('warehouse', 'product', 'quantity')
+    batch_size = 500
+
+    def __init__(self, rows, default_mode=MODE_SET):
+        self.rows = rows
+        self.default_mode = default_mode
+        self.errors = []
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    # Reading
+
+    @classmethod
+    def from_file(cls, file, filename=None, default_mode=MODE_SET):
+        """Build an import from an uploaded/opened .csv or .xlsx file"""
+        filename = filename or getattr(file, 'name', '') or ''
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.xlsx':
+            rows = cls.read_xlsx(file)
+        else:
+            rows = cls.read_csv(file)
+        return cls(rows, default_mode=default_mode)
+
+    @staticmethod
+    def read_csv(file):
+        content = file.read()
+        if isinstance(content, bytes):
+            try:
+                content = content.decode('utf-8-sig')
+            except UnicodeDecodeError as exc:
+                raise StockImportError(
+                    f"The file is not UTF-8 text (invalid byte at position {exc.start}); "
+                    "save it as \"CSV UTF-8\" and upload it again."
+                )
+        # strict: reject malformed quoting instead of guessing where fields end
+        reader = csv.DictReader(io.StringIO(content), strict=True)
+        rows = []
+        try:
+            for row in reader:
+                # DictReader puts values beyond the header under the None key
+                if None in row:
+                    raise StockImportError(
+                        f"Row {len(rows) + 2}: {len(reader.fieldnames) + len(row[None])} values "
+                        f"but the header has {len(reader.fieldnames)} columns"
+                    )
+                rows.append({(key or '').strip().lower(): (value or '').strip() for key, value in row.items()})
+        except csv.Error as exc:
+            line = len(rows) + 2 if reader.fieldnames else 1  # line 1 is the header
+            raise StockImportError(f"Row {line}: the file is not valid CSV ({exc})")
+        return rows
+
+    @staticmethod
+    def read_xlsx(file):
+        try:
+            from openpyxl import load_workbook
+            from openpyxl.utils.exceptions import InvalidFileException
+        except ImportError:
+            raise StockImportError("Reading .xlsx sheets requires openpyxl; upload a .csv file instead.")
+        try:
+            sheet = load_workbook(file, read_only=True, data_only=True).active
+            rows = sheet.iter_rows(values_only=True)
+            header = [str(cell or '').strip().lower() for cell in next(rows, [])]
+            return [
+                {key: str(value).strip() if value is not None else '' for key, value in zip(header, row)}
+                for row in rows
+                if any(value is not None for value in row)
+            ]
+        except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError) as exc:
+            raise StockImportError(f"The file is not a readable .xlsx workbook ({exc})")
+
+    # Validation
+
+    def add_error(self, line, message):
+        self.errors.append(f"Row {line}: {message}")
+
+    def resolve(self, model, references, label):
+        """Map every sheet reference (id or name) to an object with a single query"""
+        ids = {ref for ref in references if ref.isdigit()}
+        names = {ref for ref in references if not ref.isdigit()}
+        objects = model.objects.filter(Q(pk__in=ids) | Q(name__in=names)).only('pk', 'name')
+
+        by_id, by_name = {}, {}
+        for obj in objects:
+            by_id[str(obj.pk)] = obj
+            by_name.setdefault(obj.name, []).append(obj)
+
+        resolved = {}
+        for ref in references:
+            if ref in ids and ref in by_id:
+                resolved[ref] = by_id[ref]
+            elif len(by_name.get(ref, [])) == 1:
+                resolved[ref] = by_name[ref][0]
+            elif len(by_name.get(ref, [])) > 1:
+                resolved[ref] = f"{label} name '{ref}' is ambiguous; use its id"
+            else:
+                resolved[ref] = f"Unknown {label.lower()} '{ref}'"
+        return resolved
+
+    def validate(self):
+        """Check every row; returns the list of parsed changes (empty on error)"""
+        if self.rows:
+            missing = [column for column in self.REQUIRED_COLUMNS if column not in self.rows[0]]
+            if missing:
+                self.errors.append(f"Missing column(s): {', '.join(missing)}")
+                return []
+        else:
+            self.errors.append("The sheet has no rows")
+            return []
+
+        warehouses = self.resolve(Warehouse, {row['warehouse'] for row in self.rows}, 'Warehouse')
+        products = self.resolve(Product, {row['product'] for row in self.rows}, 'Product')
+
+        changes = []
+        for line, row in enumerate(self.rows, start=2):  # line 1 is the header
+            warehouse = warehouses.get(row['warehouse'])
+            product = products.get(row['product'])
+            mode = (row.get('mode') or self.default_mode).lower()
+            row_ok = True
+
+            for obj in (warehouse, product):
+                if isinstance(obj, str):
+                    self.add_error(line, obj)
+                    row_ok = False
+            if mode not in self.MODES:
+                self.add_error(line, f"Mode must be one of {', '.join(self.MODES)}, not '{mode}'")
+                row_ok = False
+            try:
+                quantity = int(row['quantity'])
+            except (TypeError, ValueError):
+                self.add_error(line, f"Quantity '{row['quantity']}' is not a whole number")
+                row_ok = False
+            else:
+                if mode == self.MODE_SET and quantity < 0:
+                    self.add_error(line, "Quantity cannot be negative when setting stock")
+                    row_ok = False
+
+            if row_ok:
+                changes.append((line, warehouse.pk, product.pk, mode, quantity))
+        return changes
+
+    # Applying
+
+    def run(self, dry_run=False, user=None):
+        """Validate and apply the sheet; returns True when it was applied (or would be)"""
+        changes = self.validate()
+        if self.errors:
+            return False
+
+        keys = {(change[1], change[2]) for change in changes}
+        warehouse_ids = {key[0] for key in keys}
+        product_ids = {key[1] for key in keys}
+
+        with transaction.atomic():
+            # One query for every touched row; the id filters can match extra
+            # warehouse/product pairs, which are dropped here
+            existing = {
+                (item.warehouse_id, item.product_id): item
+                for item in WarehouseProduct.objects.select_for_update().filter(
+                    warehouse_id__in=warehouse_ids,
+                    product_id__in=product_ids
+                )
+                if (item.warehouse_id, item.product_id) in keys
+            }
+            original = {key: item.quantity for key, item in existing.items()}
+            new_items = {}
+
+            for line, warehouse_id, product_id, mode, quantity in changes:
+                key = (warehouse_id, product_id)
+                item = existing.get(key) or new_items.get(key)
+                if item is None:
+                    item = WarehouseProduct(warehouse_id=warehouse_id, product_id=product_id, quantity=0)
+                    new_items[key] = item
+                item.quantity = quantity if mode == self.MODE_SET else item.quantity + quantity
+                if item.quantity < 0:
+                    self.add_error(line, "Adding this quantity would make the stock negative")
+
+            if self.errors:
+                transaction.set_rollback(True)
+                return False
+
+            changed = [item for key, item in existing.items() if item.quantity != original[key]]
+            self.created = len(new_items)
+            self.updated = len(changed)
+            self.unchanged = len(existing) - len(changed)
+
+            if dry_run:
+                return True
+            WarehouseProduct.objects.bulk_create(new_items.values(), batch_size=self.batch_size)
+            WarehouseProduct.objects.bulk_update(changed, ['quantity'], batch_size=self.batch_size)
+            movements = [
+                StockMovement(
+                    warehouse_id=item.warehouse_id,
+                    product_id=item.product_id,
+                    change=item.quantity - original.get(key, 0),
+                    reason=StockMovement.REASON_IMPORT,
+                    created_by=user,
+                )
+                for key, item in list(existing.items()) + list(new_items.items())
+                if item.quantity != original.get(key, 0)
+            ]
+            StockMovement.objects.bulk_create(movements, batch_size=self.batch_size)
+        return True
+
+    @property
+    def summary(self):
+        return f"{self.created} created, {self.updated} updated, {self.unchanged} unchanged"
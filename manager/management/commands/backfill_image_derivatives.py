@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from manager import images
+from manager.models import DerivativeStatus
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate derivatives for existing product images: every image not marked done, "
+        "and done images whose derivative files are missing from storage"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Regenerate every image, e.g. after changing images.SIZES or FORMATS",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help="Rows to load per query",
+        )
+
+    def handle(self, *args, **options):
+        counts = {DerivativeStatus.DONE: 0, DerivativeStatus.FAILED: 0}
+        for model, field, status_field in images.sources():
+            rows = model.objects.exclude(**{field: ''}).order_by('pk')
+            for instance in rows.iterator(chunk_size=options['batch_size']):
+                fieldfile = getattr(instance, field)
+                is_done = getattr(instance, status_field) == DerivativeStatus.DONE
+                if is_done and not options['force'] and images.exists(fieldfile):
+                    continue
+                status, error = images.process(instance, field, status_field)
+                counts[status] += 1
+                if error:
+                    self.stderr.write(f"{model.__name__} #{instance.pk} ({fieldfile.name}) failed: {error}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated derivatives for {counts[DerivativeStatus.DONE]} image(s), "
+            f"{counts[DerivativeStatus.FAILED]} failed"
+        ))
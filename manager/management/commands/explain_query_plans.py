@@ -0,0 +1,146 @@
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+
+from manager.models import Installment, Invoice, Product
+from manager.seed import SeedData
+
+
+def invoice_status_range():
+    since = timezone.now() - timedelta(days=30)
+    return Invoice.objects.filter(status=Invoice.STATUS_SENT, date_created__gte=since).order_by('-date_created')[:20]
+
+
+def installments_due_soon():
+    until = timezone.now().date() + timedelta(days=30)
+    return Installment.objects.filter(is_paid=False, due_date__lte=until).order_by('due_date')[:50]
+
+
+# The access paths the indexes are meant for: (name, function returning the queryset)
+QUERY_SHAPES = [
+    ('invoice_list', lambda: Invoice.objects.order_by('-date_created')[:20]),
+    ('invoice_list_status_range', invoice_status_range),
+    ('invoice_default_ordering', lambda: Invoice.objects.all()[:20]),
+    ('catalog_category_by_price', lambda: Product.objects.filter(category=Product.Category.MOVING_HEAD).order_by('-price', 'pk')[:24]),
+    ('catalog_category_newest', lambda: Product.objects.filter(category=Product.Category.MOVING_HEAD).order_by('-created_at')[:24]),
+    ('installments_due_soon', installments_due_soon),
+]
+
+MODELS = [Product, Invoice, Installment]
+
+# Indexes that existed before the composite ones replaced them, restored for the baseline
+BASELINE_INDEXES = [
+    (Product, models.Index(fields=['category'], name='product_category_baseline')),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and show the query plan and timing of the "
+        "hot list queries with and without the composite indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=10000,
+            help="Number of products to seed (other tables scale with it)",
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help="Timed runs per query; the median is reported",
+        )
+        parser.add_argument(
+            '--output',
+            help="Also write the plans and timings to this JSON file",
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = self.run(options['scale'], options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run(self, scale, repeat):
+        call_command('flush', interactive=False, verbosity=0)
+        rows = SeedData.for_scale(scale).run()
+        self.analyze()
+        self.stdout.write(f"Seeded {sum(rows.values())} rows ({connection.vendor})")
+
+        with_indexes = self.measure(repeat)
+        self.drop_indexes()
+        try:
+            without_indexes = self.measure(repeat)
+        finally:
+            self.create_indexes()
+
+        results = {'scale': scale, 'database': connection.vendor, 'queries': {}}
+        for name, _ in QUERY_SHAPES:
+            before, after = without_indexes[name], with_indexes[name]
+            results['queries'][name] = {'without_indexes': before, 'with_indexes': after}
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"\n{name}: {before['median_ms']:.2f} ms -> {after['median_ms']:.2f} ms"
+            ))
+            self.stdout.write("  without indexes:")
+            self.stdout.write(self.indent(before['plan']))
+            self.stdout.write("  with indexes:")
+            self.stdout.write(self.indent(after['plan']))
+        return results
+
+    def analyze(self):
+        # Give the planner row statistics, as a long-running database would have
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in MODELS:
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+            for model, index in BASELINE_INDEXES:
+                editor.add_index(model, index)
+        self.analyze()
+
+    def create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model, index in BASELINE_INDEXES:
+                editor.remove_index(model, index)
+            for model in MODELS:
+                for index in model._meta.indexes:
+                    editor.add_index(model, index)
+        self.analyze()
+
+    def measure(self, repeat):
+        results = {}
+        for name, queryset in QUERY_SHAPES:
+            plan = queryset().explain()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = {'plan': plan, 'median_ms': round(statistics.median(timings), 3)}
+        return results
+
+    def indent(self, text):
+        return '\n'.join(f"    {line}" for line in text.splitlines())
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from manager.imports import StockImport, StockImportError
+
+
+class Command(BaseCommand):
+    help = "Bulk import warehouse stock levels from a .csv or .xlsx sheet (warehouse, product, quantity, mode)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Path to the stock sheet")
+        parser.add_argument(
+            '--mode',
+            choices=StockImport.MODES,
+            default=StockImport.MODE_SET,
+            help="Mode for rows that do not have a mode column value",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Validate the sheet and report the changes without writing them",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                stock_import = StockImport.from_file(file, options['path'], default_mode=options['mode'])
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+        except StockImportError as exc:
+            raise CommandError(str(exc))
+
+        if not stock_import.run(dry_run=options['dry_run']):
+            for error in stock_import.errors:
+                self.stderr.write(error)
+            raise CommandError(f"Import aborted: {len(stock_import.errors)} error(s), nothing was written")
+
+        prefix = "Dry run: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{stock_import.summary}"))
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from manager.models import Invoice, InvoiceItem
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored invoice subtotal/total columns from the invoice items"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only verify the stored totals; exit with an error if any are stale",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Number of invoices written per UPDATE batch",
+        )
+
+    def handle(self, *args, **options):
+        subtotals = {}
+        for invoice_id, unit_price, quantity in InvoiceItem.objects.values_list(
+            'invoice_id', 'unit_price', 'quantity'
+        ).iterator(chunk_size=2000):
+            subtotals[invoice_id] = subtotals.get(invoice_id, Decimal('0.00')) + unit_price * quantity
+
+        stale = []
+        checked = 0
+        invoices = Invoice.objects.only(
+            'number', 'tax_percentage', 'discount_amount',
+            'calculated_subtotal', 'calculated_total'
+        ).iterator(chunk_size=2000)
+        for invoice in invoices:
+            checked += 1
+            subtotal = subtotals.get(invoice.pk, Decimal('0.00')).quantize(Decimal('0.01'))
+            total = invoice.compute_total(subtotal)
+            if subtotal != invoice.calculated_subtotal or total != invoice.calculated_total:
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f"Invoice #{invoice.pk}: stored {invoice.calculated_subtotal}/{invoice.calculated_total}, "
+                        f"expected {subtotal}/{total}"
+                    )
+                invoice.calculated_subtotal = subtotal
+                invoice.calculated_total = total
+                stale.append(invoice)
+
+        if options['check']:
+            if stale:
+                raise CommandError(f"{len(stale)} of {checked} invoices have stale totals")
+            self.stdout.write(self.style.SUCCESS(f"All {checked} invoice totals are up to date"))
+            return
+
+        with transaction.atomic():
+            Invoice.objects.bulk_update(
+                stale, ['calculated_subtotal', 'calculated_total'],
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {len(stale)} of {checked} invoices"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from manager import search
+
+
+class Command(BaseCommand):
+    help = "Recreate the product full-text search index and re-read every product into it"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help="Database alias to rebuild the index on",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stdout.write(f"{connection.vendor} has no search index; searches use icontains")
+            return
+        if not search.install(connection):
+            search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f"Product search index rebuilt on {connection.vendor}"))
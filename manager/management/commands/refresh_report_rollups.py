@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from manager import reports
+
+
+class Command(BaseCommand):
+    help = "Update the reporting rollup tables from invoices edited since the last refresh"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Rebuild every rollup from scratch, e.g. after bulk updates that skip last_edit_time",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help="Keep refreshing every this many seconds instead of exiting",
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            start = time.perf_counter()
+            days = reports.refresh(full=full)
+            elapsed = time.perf_counter() - start
+            if days is None:
+                self.stdout.write(self.style.SUCCESS(f"Rebuilt all report rollups in {elapsed:.1f}s"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Refreshed {days} day(s) of report rollups in {elapsed:.1f}s"))
+            if not options['interval']:
+                return
+            full = False
+            time.sleep(options['interval'])
@@ -0,0 +1,221 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import Client as TestClient
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from manager.models import Invoice, Product
+from manager.seed import SeedData
+from sales.views import CategoryCatalogView
+
+
+def invoice_with_most_items():
+    invoice = Invoice.objects.annotate(item_count=Count('items')).order_by('-item_count').first()
+    return reverse('invoice_detail', kwargs={'pk': invoice.pk})
+
+
+def catalog_category_sorted():
+    # sales.filters.ProductFilter sorts with ?sort=; page 2 unless the category has a single page
+    count = Product.objects.filter(category=Product.Category.MOVING_HEAD).count()
+    page = 2 if count > CategoryCatalogView.paginate_by else 1
+    return reverse('Moving_dashboard') + f'?sort=-created_at&page={page}'
+
+
+# The hot pages: (name, function returning the URL once the data is seeded)
+BENCHMARKS = [
+    ('catalog_all', lambda: reverse('All_products')),
+    ('catalog_category', lambda: reverse('Moving_dashboard')),
+    ('catalog_category_sorted', catalog_category_sorted),
+    ('product_list', lambda: reverse('product_list')),
+    ('invoice_list', lambda: reverse('invoice_list')),
+    ('invoice_detail', invoice_with_most_items),
+    ('client_export', lambda: reverse('client_export')),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database at each scale and benchmark the hot pages "
+        "(queries, wall time, peak memory); results are written as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 100000],
+            help="Numbers of products to seed (other tables scale with it)",
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help="Timed requests per page; the median and minimum are reported",
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            choices=[name for name, url in BENCHMARKS],
+            help="Only run these benchmarks",
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark-results.json',
+            help="Where to write the JSON results",
+        )
+        parser.add_argument(
+            '--compare',
+            help="Earlier results file to compare against",
+        )
+
+    def handle(self, *args, **options):
+        benchmarks = [
+            (name, url) for name, url in BENCHMARKS
+            if not options['only'] or name in options['only']
+        ]
+        results = {
+            'commit': self.git_commit(),
+            'recorded_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'scales': {},
+        }
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(VIEW_METRICS_ENABLED=False, DEBUG=False):
+                for scale in options['scales']:
+                    results['scales'][str(scale)] = self.run_scale(scale, benchmarks, options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_scale(self, scale, benchmarks, repeat):
+        call_command('flush', interactive=False, verbosity=0)
+        user = User.objects.create_user(username='benchmark', password='benchmark', is_staff=True)
+
+        start = time.perf_counter()
+        rows = SeedData.for_scale(scale).run()
+        seed_seconds = time.perf_counter() - start
+        self.stdout.write(f"Scale {scale}: seeded {sum(rows.values())} rows in {seed_seconds:.1f}s")
+
+        client = TestClient()
+        client.force_login(user)
+        pages = {}
+        for name, url in benchmarks:
+            pages[name] = result = self.measure(client, url(), repeat)
+            self.stdout.write(
+                f"  {name:<26} {result['status']}  {result['queries']:>4} queries  "
+                f"{result['wall_ms_median']:>9.1f} ms  {result['peak_kb']:>9.0f} KiB peak  "
+                f"(warm: {result['cached_queries']} queries, {result['cached_ms_median']:.1f} ms)"
+            )
+        return {'seed_seconds': round(seed_seconds, 2), 'rows': rows, 'pages': pages}
+
+    def fetch(self, client, url):
+        response = client.get(url)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def clear_page_cache(self):
+        caches[settings.SALES_CACHE_ALIAS].clear()
+
+    def measure(self, client, url, repeat):
+        self.fetch(client, url)  # warm lazy imports
+
+        # Timed runs render the page: the storefront page cache would
+        # otherwise answer every request after the warm-up
+        timings = []
+        for _ in range(repeat):
+            self.clear_page_cache()
+            reset_queries()  # a full queries_log would hide new queries
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response, body = self.fetch(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            # captured_queries is read lazily from the log the next request clears
+            query_count = len(queries)
+
+        # Then the same page served from a warm cache (a no-op for uncached pages)
+        cached_timings = []
+        for _ in range(repeat):
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                self.fetch(client, url)
+                cached_timings.append((time.perf_counter() - start) * 1000)
+            cached_query_count = len(queries)
+
+        # Peak memory is measured on a separate request, tracemalloc slows everything down
+        self.clear_page_cache()
+        tracemalloc.start()
+        self.fetch(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            'url': url,
+            'status': response.status_code,
+            'queries': query_count,
+            'wall_ms_median': round(statistics.median(timings), 2),
+            'wall_ms_min': round(min(timings), 2),
+            'cached_queries': cached_query_count,
+            'cached_ms_median': round(statistics.median(cached_timings), 2),
+            'peak_kb': round(peak / 1024, 1),
+            'bytes': len(body),
+        }
+
+    def compare(self, path, results):
+        try:
+            with open(path) as file:
+                previous = json.load(file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+        self.stdout.write(f"\nCompared with {previous.get('commit') or path}:")
+        for scale, current in results['scales'].items():
+            old_pages = previous.get('scales', {}).get(scale, {}).get('pages', {})
+            for name, page in current['pages'].items():
+                old = old_pages.get(name)
+                if not old:
+                    continue
+                change = (page['wall_ms_median'] - old['wall_ms_median']) / old['wall_ms_median'] * 100
+                line = (
+                    f"  {scale:>7} {name:<26} queries {old['queries']} -> {page['queries']}, "
+                    f"median {old['wall_ms_median']:.1f} -> {page['wall_ms_median']:.1f} ms ({change:+.0f}%)"
+                )
+                if page['queries'] > old['queries']:
+                    line = self.style.ERROR(line)
+                self.stdout.write(line)
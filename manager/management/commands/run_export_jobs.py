@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from manager.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued background export jobs, writing the files to PRIVATE_MEDIA_ROOT/exports/ "
+        "and deleting those older than EXPORT_CACHE_TTL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the jobs currently queued and exit instead of polling",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help="Seconds to wait between polls when the queue is empty",
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=30 * 60,
+            help="Requeue jobs left running this many seconds by a worker that died",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.requeue_stale(options['stale_after'])
+            self.purge_expired()
+            processed = 0
+            while self.process_next():
+                processed += 1
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} export job(s)"))
+                return
+            if not processed:
+                time.sleep(options['interval'])
+
+    def requeue_stale(self, stale_after):
+        cutoff = timezone.now() - timedelta(seconds=stale_after)
+        requeued = ExportJob.objects.filter(
+            status=ExportJob.STATUS_RUNNING,
+            started_at__lt=cutoff
+        ).update(status=ExportJob.STATUS_PENDING, started_at=None)
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale export job(s)")
+
+    def purge_expired(self):
+        purged = ExportJob.purge_expired()
+        if purged:
+            self.stdout.write(f"Deleted {purged} expired export job(s) and their files")
+
+    def process_next(self):
+        """Claim the oldest pending job and run it; returns False when the queue is empty"""
+        while True:
+            job = ExportJob.objects.filter(status=ExportJob.STATUS_PENDING).order_by('created_at').first()
+            if job is None:
+                return False
+            # Only one worker wins the claim; the others move on to the next job
+            claimed = ExportJob.objects.filter(pk=job.pk, status=ExportJob.STATUS_PENDING).update(
+                status=ExportJob.STATUS_RUNNING,
+                started_at=timezone.now()
+            )
+            if claimed:
+                break
+
+        job.refresh_from_db()
+        if job.run():
+            self.stdout.write(f"Export #{job.pk} ({job.export_name}): {job.row_count} rows -> {job.file.name}")
+        else:
+            self.stderr.write(f"Export #{job.pk} ({job.export_name}) failed: {job.error}")
+        return True
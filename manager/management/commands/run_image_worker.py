@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from manager import images
+from manager.models import DerivativeStatus
+
+
+class Command(BaseCommand):
+    help = "Generate responsive WebP/JPEG derivatives for newly uploaded product images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process the images currently pending and exit instead of polling",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help="Seconds to wait between polls when nothing is pending",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help="Rows to load per query",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            while True:
+                batch = self.process_batch(options['batch_size'])
+                if not batch:
+                    break
+                processed += batch
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f"Processed {processed} image(s)"))
+                return
+            if not processed:
+                time.sleep(options['interval'])
+
+    def process_batch(self, batch_size):
+        """Process up to batch_size pending rows per model; returns how many were processed"""
+        processed = 0
+        for model, field, status_field in images.sources():
+            pending = (
+                model.objects.filter(**{status_field: DerivativeStatus.PENDING})
+                .exclude(**{field: ''})
+                .order_by('pk')[:batch_size]
+            )
+            for instance in pending:
+                processed += 1
+                status, error = images.process(instance, field, status_field)
+                name = getattr(instance, field).name
+                if status == DerivativeStatus.FAILED:
+                    self.stderr.write(f"{model.__name__} #{instance.pk} ({name}) failed: {error}")
+                else:
+                    self.stdout.write(f"{model.__name__} #{instance.pk}: {name}")
+        return processed
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from manager.seed import SeedData
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic products, stock, clients, invoices, items and installments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=1000,
+            help="Number of products; the other tables are sized in proportion",
+        )
+        parser.add_argument('--warehouses', type=int, help="Override the number of warehouses")
+        parser.add_argument('--clients', type=int, help="Override the number of clients")
+        parser.add_argument('--invoices', type=int, help="Override the number of invoices")
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Random seed; the same seed and sizes give the same data",
+        )
+
+    def handle(self, *args, **options):
+        seed = SeedData.for_scale(options['scale'], seed=options['seed'])
+        for name in ('warehouses', 'clients', 'invoices'):
+            if options[name] is not None:
+                setattr(seed, name, options[name])
+        seed.stock_per_product = min(seed.stock_per_product, seed.warehouses)
+
+        counts = seed.run()
+        summary = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}"))
@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from moonstar.routers import PRIMARY, REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the replica file (SQLITE_REPLICA_PATH), "
+        "standing in for replication when testing read-replica routing locally"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help="Keep copying every this many seconds, simulating replication lag",
+        )
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.settings:
+            raise CommandError("No replica database is configured; set SQLITE_REPLICA_PATH")
+        primary, replica = connections.settings[PRIMARY], connections.settings[REPLICA]
+        if primary['ENGINE'] != replica['ENGINE'] or 'sqlite3' not in primary['ENGINE']:
+            raise CommandError("Both the primary and the replica must be SQLite databases")
+
+        while True:
+            start = time.perf_counter()
+            source = sqlite3.connect(primary['NAME'])
+            target = sqlite3.connect(replica['NAME'])
+            try:
+                # The backup API copies a consistent snapshot, even while the primary is written to
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+            self.stdout.write(self.style.SUCCESS(
+                f"Copied {primary['NAME']} -> {replica['NAME']} in {(time.perf_counter() - start) * 1000:.0f} ms"
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,85 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand
+
+from moonstar.middleware import get_store
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0
+    index = max(0, min(len(values) - 1, math.ceil(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = "Print p50/p95/p99 latency and query counts per view from the recorded view metrics"
+
+    SORT_KEYS = {
+        'p95': lambda row: row['latency'][1],
+        'p99': lambda row: row['latency'][2],
+        'queries': lambda row: row['queries'][1],
+        'sql': lambda row: row['sql'][1],
+        'requests': lambda row: row['requests'],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=24,
+            help="Only include requests from the last N hours (0 for everything kept)",
+        )
+        parser.add_argument(
+            '--sort',
+            choices=sorted(self.SORT_KEYS),
+            default='p95',
+            help="Column the worst offenders are ranked by",
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10,
+            help="Number of worst offenders to list",
+        )
+
+    def summarise(self, view, samples):
+        columns = list(zip(*samples))
+        row = {'view': view, 'requests': len(samples)}
+        for name, values in zip(('latency', 'sql', 'template', 'queries'), columns):
+            values = sorted(values)
+            row[name] = [percentile(values, pct) for pct in (50, 95, 99)]
+        return row
+
+    def handle(self, *args, **options):
+        since = time.time() - options['hours'] * 3600 if options['hours'] else None
+        samples = get_store().load(since)
+        if not samples:
+            self.stdout.write("No view metrics recorded yet")
+            return
+
+        rows = [self.summarise(view, view_samples) for view, view_samples in samples.items()]
+
+        self.stdout.write(
+            f"{'View':<32} {'Reqs':>6}  {'Latency ms p50/p95/p99':>24}  "
+            f"{'SQL ms p95':>10}  {'Tpl ms p95':>10}  {'Queries p50/p95/p99':>20}"
+        )
+        for row in sorted(rows, key=lambda row: row['view']):
+            latency = '/'.join(f"{value:.0f}" for value in row['latency'])
+            queries = '/'.join(f"{value:.0f}" for value in row['queries'])
+            self.stdout.write(
+                f"{row['view'][:32]:<32} {row['requests']:>6}  {latency:>24}  "
+                f"{row['sql'][1]:>10.1f}  {row['template'][1]:>10.1f}  {queries:>20}"
+            )
+
+        self.stdout.write("")
+        self.stdout.write(self.style.WARNING(f"Worst offenders by {options['sort']}:"))
+        worst = sorted(rows, key=self.SORT_KEYS[options['sort']], reverse=True)[:options['limit']]
+        for position, row in enumerate(worst, start=1):
+            self.stdout.write(
+                f"{position:>2}. {row['view']}: p95 {row['latency'][1]:.0f} ms, "
+                f"p95 {row['queries'][1]:.0f} queries ({row['sql'][1]:.1f} ms SQL), "
+                f"{row['requests']} requests"
+            )
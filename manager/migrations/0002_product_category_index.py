@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.CharField(choices=[('Moving Head', 'Moving Head'), ('Led Par', 'Led Par'), ('Smoke', 'Smoke'), ('Controlls', 'Controlls'), ('Laser Beam', 'Laser Beam'), ('Lamps', 'Lamps'), ('Truss', 'Truss'), ('Led Screens', 'Led Screens'), ('Accessories', 'Accessories'), ('Other', 'Other')], db_index=True, default='Other', max_length=20, verbose_name='Product Category'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:36
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def populate_totals(apps, schema_editor):
+    Invoice = apps.get_model('manager', 'Invoice')
+    InvoiceItem = apps.get_model('manager', 'InvoiceItem')
+
+    subtotals = {}
+    for invoice_id, unit_price, quantity in InvoiceItem.objects.values_list(
+        'invoice_id', 'unit_price', 'quantity'
+    ).iterator():
+        subtotals[invoice_id] = subtotals.get(invoice_id, Decimal('0.00')) + unit_price * quantity
+
+    invoices = list(Invoice.objects.all())
+    for invoice in invoices:
+        subtotal = subtotals.get(invoice.pk, Decimal('0.00')).quantize(Decimal('0.01'))
+        tax_amount = (subtotal * invoice.tax_percentage / 100).quantize(Decimal('0.01'))
+        invoice.calculated_subtotal = subtotal
+        invoice.calculated_total = (subtotal + tax_amount - invoice.discount_amount).quantize(Decimal('0.01'))
+    Invoice.objects.bulk_update(invoices, ['calculated_subtotal', 'calculated_total'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0002_product_category_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='calculated_subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='calculated_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(populate_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from manager import search
+
+
+def create_search_index(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0005_stockmovement'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
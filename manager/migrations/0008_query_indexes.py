@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0007_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='category',
+            field=models.CharField(choices=[('Moving Head', 'Moving Head'), ('Led Par', 'Led Par'), ('Smoke', 'Smoke'), ('Controlls', 'Controlls'), ('Laser Beam', 'Laser Beam'), ('Lamps', 'Lamps'), ('Truss', 'Truss'), ('Led Screens', 'Led Screens'), ('Accessories', 'Accessories'), ('Other', 'Other')], default='Other', max_length=20, verbose_name='Product Category'),
+        ),
+        migrations.AddIndex(
+            model_name='installment',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['due_date'], name='installment_unpaid_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'date_created'], name='invoice_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['date_created'], name='invoice_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['last_edit_time'], name='invoice_last_edit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('refreshed_through', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StaleRollupDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='InstallmentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('due_date', models.DateField()),
+                ('installment_count', models.PositiveIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_date'], name='manager_ins_due_dat_60e1b6_idx')],
+                'unique_together': {('day', 'due_date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('Moving Head', 'Moving Head'), ('Led Par', 'Led Par'), ('Smoke', 'Smoke'), ('Controlls', 'Controlls'), ('Laser Beam', 'Laser Beam'), ('Lamps', 'Lamps'), ('Truss', 'Truss'), ('Led Screens', 'Led Screens'), ('Accessories', 'Accessories'), ('Other', 'Other')], max_length=20)),
+                ('quantity', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='manager.product')),
+            ],
+            options={
+                'unique_together': {('day', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ReceivableRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('date_due', models.DateField()),
+                ('invoice_count', models.PositiveIntegerField()),
+                ('outstanding', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='manager.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='manager_rec_day_948582_idx'), models.Index(fields=['date_due'], name='manager_rec_date_du_881796_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('invoice_count', models.PositiveIntegerField()),
+                ('billed', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('paid', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='manager.client')),
+            ],
+            options={
+                'unique_together': {('day', 'client')},
+            },
+        ),
+    ]
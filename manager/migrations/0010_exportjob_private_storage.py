@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:19
+
+import manager.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0009_reporting_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=manager.storage.PrivateStorage(), upload_to='exports/'),
+        ),
+    ]
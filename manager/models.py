@@ -1,13 +1,65 @@
-from django.db import models
+import io
+import json
+import os
+import secrets
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, models, transaction
 from django.core.validators import MinValueValidator, RegexValidator
 from decimal import Decimal
-from django.db.models import Sum, Max
+from django.db.models import Sum, Max, Value, F, Q, Count, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from datetime import date
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from moonstar.routers import replica_reads
+
+from .storage import private_storage
+
+
+class DerivativeStatus(models.TextChoices):
+    """Progress of an image's responsive derivatives (see manager/images.py)"""
+    PENDING = 'pending', 'Pending'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+def _queue_derivatives(instance, field, status_field, original_attr, save_kwargs):
+    """Mark a new or replaced image pending so run_image_worker regenerates its derivatives"""
+    if field in instance.get_deferred_fields():
+        return
+    if getattr(instance, field).name == getattr(instance, original_attr, None):
+        return
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None:
+        if field not in update_fields:
+            return
+        save_kwargs['update_fields'] = [*update_fields, status_field]
+    setattr(instance, status_field, DerivativeStatus.PENDING)
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_stock_totals(self):
+        """Annotate each product with its stock summed across all warehouses"""
+        if 'stock_quantity' in self.query.annotations:
+            return self
+        return self.annotate(
+            stock_quantity=Coalesce(Sum('warehouse_products__quantity'), Value(0))
+        )
+
+    def search(self, query):
+        """Full-text prefix search on name and details, ranked best first (see manager/search.py)"""
+        from .search import search_products
+        return search_products(self, query)
+
 
 class Product(models.Model):
+    LOW_STOCK_THRESHOLD = 5
+
     class Category(models.TextChoices):
         MOVING_HEAD = 'Moving Head', 'Moving Head'
         LED_PAR = 'Led Par', 'Led Par'
@@ -34,21 +86,58 @@ class Product(models.Model):
     )
     details = models.TextField(blank=True, null=True)
     main_image = models.ImageField(upload_to='products/main_images/')
+    main_image_status = models.CharField(
+        max_length=10,
+        choices=DerivativeStatus.choices,
+        default=DerivativeStatus.PENDING,
+        db_index=True,
+        editable=False
+    )
     video = models.FileField(upload_to='products/videos/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # The storefront filters on category and sorts by price or age; the
+        # composite indexes also serve plain category lookups
+        indexes = [
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+        ]
+
     @property
     def total_quantity(self):
         """Returns the sum of all quantities of this product across all warehouses"""
+        if hasattr(self, 'stock_quantity'):
+            return self.stock_quantity
         result = WarehouseProduct.objects.filter(
             product=self
         ).aggregate(total=Sum('quantity'))
         return result['total'] or 0
 
+    @property
+    def main_image_derivatives(self):
+        from .images import Derivatives
+        return Derivatives(self.main_image, self.main_image_status == DerivativeStatus.DONE)
+
     def __str__(self):
         return f"{self.name} ({self.get_category_display()})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so a move can invalidate both storefront pages
+        instance._original_category = instance.__dict__.get('category')
+        instance._original_main_image = instance.__dict__.get('main_image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        _queue_derivatives(self, 'main_image', 'main_image_status', '_original_main_image', kwargs)
+        super().save(*args, **kwargs)
+        self._original_main_image = self.main_image.name
+
 
 class ProductImage(models.Model):
     product = models.ForeignKey(
@@ -57,11 +146,78 @@ class ProductImage(models.Model):
         on_delete=models.CASCADE
     )
     image = models.ImageField(upload_to='products/images/')
+    image_status = models.CharField(
+        max_length=10,
+        choices=DerivativeStatus.choices,
+        default=DerivativeStatus.PENDING,
+        db_index=True,
+        editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def derivatives(self):
+        from .images import Derivatives
+        return Derivatives(self.image, self.image_status == DerivativeStatus.DONE)
+
     def __str__(self):
         return f"Image for {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._original_image = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        _queue_derivatives(self, 'image', 'image_status', '_original_image', kwargs)
+        super().save(*args, **kwargs)
+        self._original_image = self.image.name
+
+
+class WarehouseQuerySet(models.QuerySet):
+    def with_inventory_summary(self):
+        """Annotate each warehouse with its stocked SKU count, unit count and stock value"""
+        if 'inventory_value' in self.query.annotations:
+            return self
+        money = DecimalField(max_digits=14, decimal_places=2)
+        return self.annotate(
+            sku_count=Count(
+                'warehouse_products',
+                filter=Q(warehouse_products__quantity__gt=0)
+            ),
+            unit_count=Coalesce(Sum('warehouse_products__quantity'), Value(0)),
+            inventory_value=Coalesce(
+                Sum(
+                    F('warehouse_products__quantity') * F('warehouse_products__product__price'),
+                    output_field=money
+                ),
+                Value(Decimal('0.00'), output_field=money)
+            ),
+        )
+
+    def inventory_summary(self):
+        """Per-warehouse and overall inventory figures as plain dicts, from one query"""
+        warehouses = [
+            {
+                'id': row['pk'],
+                'name': row['name'],
+                'sku_count': row['sku_count'],
+                'unit_count': row['unit_count'],
+                'inventory_value': Decimal(row['inventory_value']).quantize(Decimal('0.01')),
+            }
+            for row in self.with_inventory_summary().order_by('name').values(
+                'pk', 'name', 'sku_count', 'unit_count', 'inventory_value'
+            )
+        ]
+        totals = {
+            'warehouse_count': len(warehouses),
+            'sku_count': sum(w['sku_count'] for w in warehouses),
+            'unit_count': sum(w['unit_count'] for w in warehouses),
+            'inventory_value': sum((w['inventory_value'] for w in warehouses), Decimal('0.00')),
+        }
+        return totals, warehouses
+
 
 class Warehouse(models.Model):
     name = models.CharField(max_length=255)
@@ -69,11 +225,15 @@ class Warehouse(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WarehouseQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     @property
     def total_inventory_value(self):
+        if hasattr(self, 'inventory_value'):
+            return self.inventory_value
         return sum(
             item.total_value 
             for item in self.warehouse_products.select_related('product')
@@ -105,6 +265,128 @@ class WarehouseProduct(models.Model):
     def total_value(self):
         return self.quantity * self.product.price
 
+    @classmethod
+    def receive(cls, warehouse, product, quantity, user=None, reason=None):
+        """
+        Add quantity units of product to warehouse as one atomic increment
+        (creating the stock row if needed) and record it in the ledger.
+        Safe against concurrent receipts for the same product.
+        """
+        reason = reason or StockMovement.REASON_RECEIPT
+        with transaction.atomic():
+            updated = cls.objects.filter(warehouse=warehouse, product=product).update(
+                quantity=F('quantity') + quantity
+            )
+            created = False
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(warehouse=warehouse, product=product, quantity=quantity)
+                    created = True
+                except IntegrityError:
+                    # Another receipt created the row first; add to it instead
+                    cls.objects.filter(warehouse=warehouse, product=product).update(
+                        quantity=F('quantity') + quantity
+                    )
+            StockMovement.objects.create(
+                warehouse=warehouse,
+                product=product,
+                change=quantity,
+                reason=reason,
+                created_by=user,
+            )
+        return created
+
+    def set_quantity(self, quantity, user=None, reason=None):
+        """Set the stock level, locking the row and recording the difference in the ledger"""
+        if quantity < 0:
+            raise ValueError("Stock quantity cannot be negative")
+        reason = reason or StockMovement.REASON_ADJUSTMENT
+        with transaction.atomic():
+            current = WarehouseProduct.objects.select_for_update().values_list(
+                'quantity', flat=True
+            ).get(pk=self.pk)
+            WarehouseProduct.objects.filter(pk=self.pk).update(quantity=quantity)
+            if quantity != current:
+                StockMovement.objects.create(
+                    warehouse_id=self.warehouse_id,
+                    product_id=self.product_id,
+                    change=quantity - current,
+                    reason=reason,
+                    created_by=user,
+                )
+        self.quantity = quantity
+
+
+class StockMovement(models.Model):
+    """Ledger of every stock change, one row per adjustment"""
+    REASON_RECEIPT = 'receipt'
+    REASON_ADJUSTMENT = 'adjustment'
+    REASON_IMPORT = 'import'
+
+    REASON_CHOICES = [
+        (REASON_RECEIPT, 'Receipt'),
+        (REASON_ADJUSTMENT, 'Adjustment'),
+        (REASON_IMPORT, 'Import'),
+    ]
+
+    warehouse = models.ForeignKey(
+        Warehouse,
+        related_name='stock_movements',
+        on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(
+        Product,
+        related_name='stock_movements',
+        on_delete=models.CASCADE
+    )
+    change = models.IntegerField(help_text="Units added (positive) or removed (negative)")
+    reason = models.CharField(max_length=12, choices=REASON_CHOICES)
+    created_by = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.SET_NULL,
+        related_name='stock_movements',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Stock Movement"
+        verbose_name_plural = "Stock Movements"
+
+    def __str__(self):
+        return f"{self.change:+d} × {self.product.name} in {self.warehouse.name} ({self.get_reason_display()})"
+
+
+class ClientQuerySet(models.QuerySet):
+    def with_lifetime_stats(self):
+        """
+        Annotate each client with lifetime billed, paid and outstanding amounts,
+        invoice count and last purchase date, from one grouped join on invoices.
+        Like the reports, only sent, installment and paid invoices count.
+        """
+        if 'lifetime_billed' in self.query.annotations:
+            return self
+        money = DecimalField(max_digits=14, decimal_places=2)
+        zero = Value(Decimal('0.00'), output_field=money)
+        billed = Q(invoices__status__in=Invoice.BILLED_STATUSES)
+        return self.annotate(
+            lifetime_billed=Coalesce(Sum('invoices__calculated_total', filter=billed), zero),
+            lifetime_paid=Coalesce(Sum('invoices__amount_paid', filter=billed), zero),
+            lifetime_outstanding=Coalesce(
+                Sum(
+                    F('invoices__calculated_total') - F('invoices__amount_paid'),
+                    filter=billed,
+                    output_field=money
+                ),
+                zero
+            ),
+            lifetime_invoices=Count('invoices', filter=billed),
+            last_purchase=Max('invoices__date_created', filter=billed),
+        )
+
 
 class Client(models.Model):
     name = models.CharField(max_length=255, verbose_name="Client Name")
@@ -123,6 +405,8 @@ class Client(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ClientQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = "Client"
@@ -141,6 +425,57 @@ class Client(models.Model):
 
 User = get_user_model()
 
+
+class InvoiceQuerySet(models.QuerySet):
+    def summary_by_status(self, today=None):
+        """
+        Billed/paid/outstanding figures and overdue counts for every invoice in
+        this queryset, computed in one grouped query.
+        Returns (totals, rows) where rows holds one dict per status. Like the
+        reports, the totals count only billed invoices towards billed and paid
+        and only open ones towards outstanding and overdue.
+        """
+        today = today or timezone.now().date()
+        money = DecimalField(max_digits=12, decimal_places=2)
+        balance = ExpressionWrapper(F('calculated_total') - F('amount_paid'), output_field=money)
+        overdue = Q(date_due__lt=today, status__in=Invoice.OPEN_STATUSES)
+        zero = Value(Decimal('0.00'), output_field=money)
+
+        rows = list(
+            self.order_by().values('status').annotate(
+                count=Count('pk'),
+                billed=Coalesce(Sum('calculated_total'), zero),
+                paid=Coalesce(Sum('amount_paid'), zero),
+                outstanding=Coalesce(Sum(balance), zero),
+                overdue_count=Count('pk', filter=overdue),
+                overdue_amount=Coalesce(Sum(balance, filter=overdue), zero),
+            ).order_by('status')
+        )
+
+        labels = dict(Invoice.STATUS_CHOICES)
+        totals = {
+            'count': 0,
+            'billed': Decimal('0.00'),
+            'paid': Decimal('0.00'),
+            'outstanding': Decimal('0.00'),
+            'overdue_count': 0,
+            'overdue_amount': Decimal('0.00'),
+        }
+        for row in rows:
+            row['label'] = labels.get(row['status'], row['status'])
+            for key in ('billed', 'paid', 'outstanding', 'overdue_amount'):
+                row[key] = Decimal(row[key]).quantize(Decimal('0.01'))
+            # Drafts and cancelled invoices are listed but were never billed
+            totals['count'] += row['count']
+            if row['status'] in Invoice.BILLED_STATUSES:
+                totals['billed'] += row['billed']
+                totals['paid'] += row['paid']
+            if row['status'] in Invoice.OPEN_STATUSES:
+                for key in ('outstanding', 'overdue_count', 'overdue_amount'):
+                    totals[key] += row[key]
+        return totals, rows
+
+
 class Invoice(models.Model):
     STATUS_DRAFT = 'draft'
     STATUS_SENT = 'sent'
@@ -156,6 +491,10 @@ class Invoice(models.Model):
         (STATUS_CANCELLED, 'Cancelled'),
     ]
 
+    # Statuses that count as revenue, and those that may still be owed
+    BILLED_STATUSES = [STATUS_SENT, STATUS_INSTALLMENT, STATUS_PAID]
+    OPEN_STATUSES = [STATUS_SENT, STATUS_INSTALLMENT]
+
     # Core Invoice Fields
     number = models.AutoField(primary_key=True, verbose_name="Invoice Number")
     client = models.ForeignKey(
@@ -212,35 +551,120 @@ class Invoice(models.Model):
     )
     installment_plan = models.TextField(blank=True, null=True, verbose_name="Installment Plan Details")
 
+    # Denormalized totals, kept in step with the items by InvoiceItem.save/delete
+    # and rebuilt by the rebuild_invoice_totals management command
+    calculated_subtotal = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+    calculated_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False
+    )
+
+    objects = InvoiceQuerySet.as_manager()
+
     class Meta:
         ordering = ['-last_edit_time']
         verbose_name = "Invoice"
         verbose_name_plural = "Invoices"
+        # InvoiceListView filters by status and date_created range and sorts by
+        # -date_created; everything else uses the default ordering
+        indexes = [
+            models.Index(fields=['status', 'date_created'], name='invoice_status_created_idx'),
+            models.Index(fields=['date_created'], name='invoice_created_idx'),
+            models.Index(fields=['last_edit_time'], name='invoice_last_edit_idx'),
+        ]
 
     def save(self, *args, **kwargs):
             """Auto-assign to current user if not assigned and handle status changes"""
             if not self.assigned_to and hasattr(self, '_current_user'):
                 self.assigned_to = self._current_user
-            
-            # Handle status-specific logic
-            if self.status == self.STATUS_PAID:
-                if not self.items.exists() and not kwargs.get('force_insert'):
-                    raise ValueError("Cannot mark empty invoice as paid")
-                self.amount_paid = self.total
-                self.is_installment = False
-            elif self.status == self.STATUS_INSTALLMENT:
-                self.is_installment = True
-            else:
-                self.is_installment = False
-                
-            super().save(*args, **kwargs)
-    
+
+            with transaction.atomic():
+                update_fields = kwargs.get('update_fields')
+                if not self._state.adding:
+                    # Items move calculated_subtotal with F() updates (apply_item_change),
+                    # so this instance's copy may be stale: never write it back, and
+                    # derive the total from the stored value, locked until the save ends
+                    stored = (
+                        Invoice.objects.select_for_update().filter(pk=self.pk)
+                        .values_list('calculated_subtotal', flat=True).first()
+                    )
+                    if stored is not None:
+                        self.calculated_subtotal = stored
+                        if update_fields is None:
+                            update_fields = [
+                                field.name for field in self._meta.concrete_fields
+                                if not field.primary_key and field.name != 'calculated_subtotal'
+                            ]
+
+                # Tax and discount may have changed, so re-derive the stored total
+                self.calculated_total = self.compute_total(self.calculated_subtotal)
+                if update_fields is not None:
+                    if 'calculated_total' not in update_fields:
+                        update_fields = list(update_fields) + ['calculated_total']
+                    kwargs['update_fields'] = update_fields
+
+                # Handle status-specific logic
+                if self.status == self.STATUS_PAID:
+                    if not self.items.exists() and not kwargs.get('force_insert'):
+                        raise ValueError("Cannot mark empty invoice as paid")
+                    self.amount_paid = self.total
+                    self.is_installment = False
+                elif self.status == self.STATUS_INSTALLMENT:
+                    self.is_installment = True
+                else:
+                    self.is_installment = False
+
+                super().save(*args, **kwargs)
+
+    def compute_total(self, subtotal):
+        """Apply this invoice's tax and discount to the given subtotal"""
+        tax_amount = (Decimal(subtotal) * Decimal(self.tax_percentage) / 100).quantize(Decimal('0.01'))
+        return (Decimal(subtotal) + tax_amount - Decimal(self.discount_amount)).quantize(Decimal('0.01'))
+
+    def apply_item_change(self, delta):
+        """Shift the stored totals by the change in one line total"""
+        if not delta:
+            return
+        Invoice.objects.filter(pk=self.pk).update(
+            calculated_subtotal=F('calculated_subtotal') + delta
+        )
+        # Tax and discount too, in case they were edited since this instance was loaded
+        self.refresh_from_db(fields=['calculated_subtotal', 'tax_percentage', 'discount_amount'])
+        self.calculated_total = self.compute_total(self.calculated_subtotal)
+        self.last_edit_time = timezone.now()
+        Invoice.objects.filter(pk=self.pk).update(
+            calculated_total=self.calculated_total,
+            last_edit_time=self.last_edit_time
+        )
+
+    def recalculate_totals(self):
+        """Rebuild the stored totals from the items; returns True if they changed"""
+        subtotal = sum(
+            (item.total for item in self.items.all()), Decimal('0.00')
+        ).quantize(Decimal('0.01'))
+        total = self.compute_total(subtotal)
+        if subtotal == self.calculated_subtotal and total == self.calculated_total:
+            return False
+        self.calculated_subtotal = subtotal
+        self.calculated_total = total
+        Invoice.objects.filter(pk=self.pk).update(
+            calculated_subtotal=subtotal,
+            calculated_total=total
+        )
+        return True
 
     # Financial Calculations
     @property
     def subtotal(self):
-        """Calculate subtotal from all items"""
-        return sum(item.total for item in self.items.all()) if self.items.exists() else Decimal('0')
+        """Subtotal of all items"""
+        return self.calculated_subtotal
     
     @property
     def tax_amount(self):
@@ -249,14 +673,19 @@ class Invoice(models.Model):
     
     @property
     def total(self):
-        """Calculate final total after tax and discount"""
-        return (self.subtotal + self.tax_amount - self.discount_amount).quantize(Decimal('0.01'))
+        """Final total after tax and discount"""
+        return self.calculated_total
     
     @property
     def balance_due(self):
         """Calculate remaining balance"""
         return (self.total - self.amount_paid).quantize(Decimal('0.01'))
     
+    @property
+    def installment_count(self):
+        """Number of installments (uses prefetched installments when available)"""
+        return len(self.installments.all())
+
     @property
     def payment_progress(self):
         """Calculate payment progress percentage"""
@@ -304,20 +733,52 @@ class Installment(models.Model):
         ordering = ['due_date']
         verbose_name = "Installment Payment"
         verbose_name_plural = "Installment Payments"
+        # Partial: only unpaid installments are ever looked up by due date, and
+        # is_paid=False compiles to NOT is_paid, which a (is_paid, due_date) index can't seek on
+        indexes = [
+            models.Index(fields=['due_date'], condition=Q(is_paid=False), name='installment_unpaid_due_idx'),
+        ]
 
     def save(self, *args, **kwargs):
-        """Update parent invoice when installment is paid"""
+        """Stamp the payment date; crediting the invoice is done by Installment.pay"""
         if self.is_paid and not self.payment_date:
             self.payment_date = timezone.now().date()
-            
-            # Update parent invoice
-            self.invoice.amount_paid += self.amount
-            if self.invoice.amount_paid >= self.invoice.total:
-                self.invoice.status = Invoice.STATUS_PAID
-            self.invoice.save()
-            
         super().save(*args, **kwargs)
 
+    @classmethod
+    def pay(cls, pk, payment_date=None):
+        """
+        Mark installment pk as paid and credit its invoice in one transaction.
+        The installment and invoice rows are locked together, the invoice's
+        amount_paid is bumped with an F() update and the paid status is
+        decided from the stored total, so concurrent clicks cannot double count.
+        Returns the paid installment, or None if it was already paid.
+        """
+        payment_date = payment_date or timezone.now().date()
+        now = timezone.now()
+        with transaction.atomic():
+            installment = cls.objects.select_for_update().select_related('invoice').get(pk=pk)
+            if installment.is_paid:
+                return None
+            invoice = installment.invoice
+
+            cls.objects.filter(pk=pk).update(is_paid=True, payment_date=payment_date, updated_at=now)
+            installment.is_paid = True
+            installment.payment_date = payment_date
+
+            invoice.amount_paid += installment.amount
+            if invoice.amount_paid >= invoice.calculated_total:
+                invoice.status = Invoice.STATUS_PAID
+                invoice.is_installment = False
+            invoice.last_edit_time = now
+            Invoice.objects.filter(pk=invoice.pk).update(
+                amount_paid=F('amount_paid') + installment.amount,
+                status=invoice.status,
+                is_installment=invoice.is_installment,
+                last_edit_time=now
+            )
+        return installment
+
     def __str__(self):
         return f"Installment #{self.id} for Invoice #{self.invoice.number} - {self.amount}"
 
@@ -376,8 +837,208 @@ class InvoiceItem(models.Model):
     def __str__(self):
         return f"{self.quantity} × {self.product.name} @ {self.unit_price}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored line total so saves can apply just the difference
+        instance._stored_total = instance.total
+        return instance
+
     def save(self, *args, **kwargs):
-        """Automatically set unit price from product if not set"""
+        """Automatically set unit price from product if not set and keep the invoice totals current"""
         if not self.unit_price and self.product_id:
             self.unit_price = self.product.price
-        super().save(*args, **kwargs)
\ No newline at end of file
+        previous_total = getattr(self, '_stored_total', Decimal('0.00')) if self.pk else Decimal('0.00')
+        super().save(*args, **kwargs)
+        self._stored_total = self.total
+        self.invoice.apply_item_change(self._stored_total - previous_total)
+
+    def delete(self, *args, **kwargs):
+        """Remove this line's total from the invoice"""
+        previous_total = getattr(self, '_stored_total', self.total)
+        result = super().delete(*args, **kwargs)
+        self.invoice.apply_item_change(-previous_total)
+        return result
+
+class ExportJob(models.Model):
+    """A CSV export written to PRIVATE_MEDIA_ROOT in the background by the run_export_jobs command"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    export_name = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    params_key = models.CharField(max_length=255, db_index=True, editable=False)
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=STATUS_PENDING
+    )
+    file = models.FileField(upload_to='exports/', storage=private_storage, blank=True, null=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='export_jobs',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Export Job"
+        verbose_name_plural = "Export Jobs"
+
+    def __str__(self):
+        return f"Export #{self.pk} {self.export_name} ({self.get_status_display()})"
+
+    @staticmethod
+    def make_params_key(export_name, params):
+        return f"{export_name}:{json.dumps(params, sort_keys=True)}"
+
+    @classmethod
+    def request(cls, export_name, params, user=None):
+        """
+        Queue an export, or reuse an identical one requested within
+        EXPORT_CACHE_TTL seconds. Returns (job, reused).
+        """
+        from .exports import EXPORTS
+
+        params = EXPORTS[export_name](params).params
+        params_key = cls.make_params_key(export_name, params)
+        fresh_since = timezone.now() - timedelta(seconds=settings.EXPORT_CACHE_TTL)
+        candidates = cls.objects.filter(
+            params_key=params_key,
+            created_at__gte=fresh_since,
+            status__in=[cls.STATUS_PENDING, cls.STATUS_RUNNING, cls.STATUS_DONE],
+        )
+        for job in candidates:
+            if job.status != cls.STATUS_DONE or (job.file and job.file.storage.exists(job.file.name)):
+                return job, True
+        job = cls.objects.create(
+            export_name=export_name,
+            params=params,
+            params_key=params_key,
+            requested_by=user if user and user.is_authenticated else None,
+        )
+        return job, False
+
+    @classmethod
+    def purge_expired(cls):
+        """
+        Delete jobs that finished more than EXPORT_CACHE_TTL seconds ago, along
+        with their files. request() no longer reuses them by then, and counting
+        from finished_at leaves a slow job's requester the full TTL to download
+        it. Returns the number of jobs deleted.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.EXPORT_CACHE_TTL)
+        expired = list(cls.objects.filter(
+            finished_at__lt=cutoff,
+            status__in=[cls.STATUS_DONE, cls.STATUS_FAILED],
+        ))
+        for job in expired:
+            if job.file:
+                job.file.delete(save=False)
+        cls.objects.filter(pk__in=[job.pk for job in expired]).delete()
+        return len(expired)
+
+    def get_export(self):
+        from .exports import EXPORTS
+        return EXPORTS[self.export_name](self.params)
+
+    def run(self):
+        """Write the export to a temporary file, then store it under PRIVATE_MEDIA_ROOT/exports/"""
+        export = self.get_export()
+        try:
+            with tempfile.TemporaryFile() as raw, replica_reads():
+                text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+                self.row_count = export.write_to(text)
+                text.flush()
+                text.detach()
+                raw.seek(0)
+                name, extension = os.path.splitext(export.filename)
+                # Unguessable as well as private, in case the directory is ever exposed
+                self.file.save(f"{name}_{self.pk}_{secrets.token_urlsafe(16)}{extension}", File(raw), save=False)
+        except Exception as exc:
+            self.status = self.STATUS_FAILED
+            self.error = str(exc)
+        else:
+            self.status = self.STATUS_DONE
+            self.error = None
+        self.finished_at = timezone.now()
+        self.save(update_fields=['file', 'row_count', 'status', 'error', 'finished_at'])
+        return self.status == self.STATUS_DONE
+
+
+# Reporting rollups, rebuilt by manager/reports.py. Every row belongs to the
+# day its invoices were created ('day'), which is the unit a refresh rebuilds.
+
+class RevenueRollup(models.Model):
+    """Billed and paid totals per invoice creation day and client"""
+    day = models.DateField()
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='+')
+    invoice_count = models.PositiveIntegerField()
+    billed = models.DecimalField(max_digits=14, decimal_places=2)
+    paid = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = ('day', 'client')
+
+
+class ProductRevenueRollup(models.Model):
+    """Units sold and line revenue (before tax and discount) per day and product"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.CharField(max_length=20, choices=Product.Category.choices)
+    quantity = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = ('day', 'product')
+
+
+class ReceivableRollup(models.Model):
+    """Open balances per invoice creation day, client and due date"""
+    day = models.DateField()
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='+')
+    date_due = models.DateField()
+    invoice_count = models.PositiveIntegerField()
+    outstanding = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        indexes = [models.Index(fields=['day']), models.Index(fields=['date_due'])]
+
+
+class InstallmentRollup(models.Model):
+    """Unpaid installment amounts per invoice creation day and due date"""
+    day = models.DateField()
+    due_date = models.DateField()
+    installment_count = models.PositiveIntegerField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        unique_together = ('day', 'due_date')
+        indexes = [models.Index(fields=['due_date'])]
+
+
+class RollupRefresh(models.Model):
+    """How far the rollups have caught up with Invoice.last_edit_time (a single row)"""
+    refreshed_through = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class StaleRollupDay(models.Model):
+    """A day whose rollups must be rebuilt although no invoice on it was edited, e.g. after a delete"""
+    day = models.DateField(unique=True)
@@ -0,0 +1,292 @@
+# reports.py
+"""
+Revenue, receivables and installment reporting.
+
+Report pages never aggregate invoices directly. They read small rollup
+tables (RevenueRollup, ProductRevenueRollup, ReceivableRollup and
+InstallmentRollup) holding one row per invoice creation day and
+client/product/due date, so their cost follows the number of days and
+clients shown rather than the number of invoices.
+
+refresh() keeps the rollups current. It finds the invoices edited since
+the last refresh (Invoice.last_edit_time, which item changes and
+installment payments also bump) and rebuilds every day those invoices
+were created on, plus days flagged by deletes (StaleRollupDay). Run it
+from cron or with `refresh_report_rollups --interval`. Bulk updates that
+skip last_edit_time, such as rebuild_invoice_totals, need a --full run.
+
+Revenue counts sent, installment and paid invoices; drafts and cancelled
+invoices are left out. Receivables and the installment forecast cover
+invoices still open (sent or installment).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import (
+    Installment, InstallmentRollup, Invoice, InvoiceItem, ProductRevenueRollup, ReceivableRollup,
+    RevenueRollup, RollupRefresh, StaleRollupDay,
+)
+
+BILLED_STATUSES = Invoice.BILLED_STATUSES
+OPEN_STATUSES = Invoice.OPEN_STATUSES
+
+ROLLUPS = [RevenueRollup, ProductRevenueRollup, ReceivableRollup, InstallmentRollup]
+
+# Edits that commit while a refresh runs can carry an earlier last_edit_time;
+# re-reading this much before the previous watermark catches them
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+# Days rebuilt per statement, well below SQLite's bound parameter limit
+DAY_BATCH = 500
+
+# (key, label, lowest and highest number of days past date_due)
+AGING_BUCKETS = [
+    ('0_30', '0–30 days', 0, 30),
+    ('31_60', '31–60 days', 31, 60),
+    ('61_90', '61–90 days', 61, 90),
+    ('90_plus', '90+ days', 91, None),
+]
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal('0.00'), output_field=MONEY)
+
+
+def _money(value):
+    return Decimal(value or 0).quantize(Decimal('0.01'))
+
+
+# Refreshing
+
+def mark_day_stale(sender, instance, **kwargs):
+    """post_delete handler: a deleted invoice's day no longer matches its rollups"""
+    StaleRollupDay.objects.get_or_create(day=timezone.localdate(instance.date_created))
+
+
+def changed_days(since):
+    """Creation days of invoices edited after since, plus days flagged stale"""
+    days = set(
+        Invoice.objects.filter(last_edit_time__gt=since)
+        .annotate(day=TruncDate('date_created'))
+        .order_by()
+        .values_list('day', flat=True)
+        .distinct()
+    )
+    days.update(StaleRollupDay.objects.values_list('day', flat=True))
+    return days
+
+
+def build_rows(invoices):
+    """Unsaved rollup rows for the given invoices (a queryset)"""
+    rows = []
+    billed = invoices.filter(status__in=BILLED_STATUSES)
+    for row in (
+        billed.annotate(day=TruncDate('date_created')).order_by()
+        .values('day', 'client_id')
+        .annotate(invoice_count=Count('pk'), billed=Sum('calculated_total'), paid=Sum('amount_paid'))
+    ):
+        rows.append(RevenueRollup(
+            day=row['day'], client_id=row['client_id'], invoice_count=row['invoice_count'],
+            billed=_money(row['billed']), paid=_money(row['paid']),
+        ))
+
+    for row in (
+        InvoiceItem.objects.filter(invoice__in=billed)
+        .annotate(day=TruncDate('invoice__date_created')).order_by()
+        .values('day', 'product_id', 'product__category')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            revenue=Sum(ExpressionWrapper(F('unit_price') * F('quantity'), output_field=MONEY)),
+        )
+    ):
+        rows.append(ProductRevenueRollup(
+            day=row['day'], product_id=row['product_id'], category=row['product__category'],
+            quantity=row['total_quantity'], revenue=_money(row['revenue']),
+        ))
+
+    balance = ExpressionWrapper(F('calculated_total') - F('amount_paid'), output_field=MONEY)
+    for row in (
+        invoices.filter(status__in=OPEN_STATUSES)
+        .annotate(day=TruncDate('date_created'), balance=balance)
+        .filter(balance__gt=0).order_by()
+        .values('day', 'client_id', 'date_due')
+        .annotate(invoice_count=Count('pk'), outstanding=Sum('balance'))
+    ):
+        rows.append(ReceivableRollup(
+            day=row['day'], client_id=row['client_id'], date_due=row['date_due'],
+            invoice_count=row['invoice_count'], outstanding=_money(row['outstanding']),
+        ))
+
+    for row in (
+        Installment.objects.filter(invoice__in=invoices.filter(status__in=OPEN_STATUSES), is_paid=False)
+        .annotate(day=TruncDate('invoice__date_created')).order_by()
+        .values('day', 'due_date')
+        .annotate(installment_count=Count('pk'), total=Sum('amount'))
+    ):
+        rows.append(InstallmentRollup(
+            day=row['day'], due_date=row['due_date'],
+            installment_count=row['installment_count'], amount=_money(row['total']),
+        ))
+    return rows
+
+
+def _save_rows(rows):
+    for model in ROLLUPS:
+        model.objects.bulk_create([row for row in rows if isinstance(row, model)], batch_size=500)
+
+
+def refresh(full=False):
+    """
+    Bring the rollups up to date; full=True rebuilds them from scratch.
+    Returns the number of days rebuilt (None for a full rebuild).
+    """
+    started = timezone.now()
+    state, _ = RollupRefresh.objects.get_or_create(pk=1)
+    full = full or state.refreshed_through is None
+
+    if full:
+        with transaction.atomic():
+            for model in ROLLUPS + [StaleRollupDay]:
+                model.objects.all().delete()
+            _save_rows(build_rows(Invoice.objects.all()))
+        rebuilt = None
+    else:
+        days = sorted(changed_days(state.refreshed_through - REFRESH_OVERLAP))
+        for start in range(0, len(days), DAY_BATCH):
+            batch = days[start:start + DAY_BATCH]
+            with transaction.atomic():
+                StaleRollupDay.objects.filter(day__in=batch).delete()
+                for model in ROLLUPS:
+                    model.objects.filter(day__in=batch).delete()
+                _save_rows(build_rows(Invoice.objects.filter(date_created__date__in=batch)))
+        rebuilt = len(days)
+
+    RollupRefresh.objects.filter(pk=state.pk).update(refreshed_through=started, finished_at=timezone.now())
+    return rebuilt
+
+
+def refreshed_through():
+    state = RollupRefresh.objects.filter(pk=1).first()
+    return state.refreshed_through if state else None
+
+
+# Reports
+
+def _revenue_totals(rows):
+    return rows.annotate(
+        invoices=Sum('invoice_count'),
+        billed_total=Sum('billed'),
+        paid_total=Sum('paid'),
+    )
+
+
+def revenue_by_day(start, end):
+    return list(
+        _revenue_totals(RevenueRollup.objects.filter(day__range=(start, end)).values('day')).order_by('day')
+    )
+
+
+def revenue_by_month(start, end):
+    return list(
+        _revenue_totals(
+            RevenueRollup.objects.filter(day__range=(start, end))
+            .annotate(month=TruncMonth('day')).values('month')
+        ).order_by('month')
+    )
+
+
+def revenue_by_client(start, end, limit=10):
+    return list(
+        _revenue_totals(
+            RevenueRollup.objects.filter(day__range=(start, end)).values('client_id', 'client__name')
+        ).order_by('-billed_total', 'client_id')[:limit]
+    )
+
+
+def revenue_by_product(start, end, limit=10):
+    return list(
+        ProductRevenueRollup.objects.filter(day__range=(start, end))
+        .values('product_id', 'product__name', 'category')
+        .annotate(units=Sum('quantity'), revenue_total=Sum('revenue'))
+        .order_by('-revenue_total', 'product_id')[:limit]
+    )
+
+
+def revenue_by_category(start, end):
+    labels = dict(ProductRevenueRollup._meta.get_field('category').choices)
+    rows = list(
+        ProductRevenueRollup.objects.filter(day__range=(start, end))
+        .values('category')
+        .annotate(units=Sum('quantity'), revenue_total=Sum('revenue'))
+        .order_by('-revenue_total')
+    )
+    for row in rows:
+        row['label'] = labels.get(row['category'], row['category'])
+    return rows
+
+
+def aging(today=None):
+    """Open balances by days past date_due, from one aggregate query"""
+    today = today or timezone.localdate()
+    aggregates = {
+        'not_due_count': Coalesce(Sum('invoice_count', filter=Q(date_due__gt=today)), 0),
+        'not_due_amount': Coalesce(Sum('outstanding', filter=Q(date_due__gt=today)), ZERO),
+    }
+    for key, _, low, high in AGING_BUCKETS:
+        window = Q(date_due__lte=today - timedelta(days=low))
+        if high is not None:
+            window &= Q(date_due__gte=today - timedelta(days=high))
+        aggregates[f'{key}_count'] = Coalesce(Sum('invoice_count', filter=window), 0)
+        aggregates[f'{key}_amount'] = Coalesce(Sum('outstanding', filter=window), ZERO)
+    totals = ReceivableRollup.objects.aggregate(**aggregates)
+
+    buckets = [{
+        'key': 'not_due', 'label': 'Not yet due',
+        'count': totals['not_due_count'], 'amount': _money(totals['not_due_amount']),
+    }]
+    for key, label, _, _ in AGING_BUCKETS:
+        buckets.append({
+            'key': key, 'label': label,
+            'count': totals[f'{key}_count'], 'amount': _money(totals[f'{key}_amount']),
+        })
+    return buckets
+
+
+def installment_forecast(today=None, months=6):
+    """
+    Unpaid installment amounts expected per month for the next `months`
+    months, plus what is already overdue. Returns (overdue, months).
+    """
+    today = today or timezone.localdate()
+    month_start = today.replace(day=1)
+    end_year, end_month = divmod(month_start.month - 1 + months, 12)
+    until = month_start.replace(year=month_start.year + end_year, month=end_month + 1)
+
+    overdue = InstallmentRollup.objects.filter(due_date__lt=today).aggregate(
+        installments=Coalesce(Sum('installment_count'), 0),
+        amount_total=Coalesce(Sum('amount'), ZERO),
+    )
+    overdue['amount_total'] = _money(overdue['amount_total'])
+
+    expected = {
+        row['month']: row
+        for row in InstallmentRollup.objects.filter(due_date__gte=today, due_date__lt=until)
+        .annotate(month=TruncMonth('due_date')).values('month')
+        .annotate(installments=Sum('installment_count'), amount_total=Sum('amount'))
+        .order_by('month')
+    }
+    forecast = []
+    month = month_start
+    while month < until:
+        row = expected.get(month, {})
+        forecast.append({
+            'month': month,
+            'installments': row.get('installments', 0),
+            'amount_total': _money(row.get('amount_total')),
+        })
+        month = (month + timedelta(days=32)).replace(day=1)
+    return overdue, forecast
@@ -0,0 +1,145 @@
+# search.py
+"""
+Full-text product search.
+
+SQLite uses an FTS5 table (manager_product_fts) that mirrors the name and
+details columns of manager_product and is kept in sync by triggers.
+PostgreSQL uses a GIN expression index over a weighted tsvector, which the
+database keeps current by itself. Other backends fall back to icontains.
+
+Every search term is matched as a prefix, all terms must match, and results
+are ranked with name matches above details matches.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'manager_product_fts'
+MAX_TERMS = 8
+
+SQLITE_INSTALL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, details,
+        content='manager_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON manager_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, details) VALUES (new.id, new.name, new.details);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON manager_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, details) VALUES ('delete', old.id, old.name, old.details);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, details ON manager_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, details) VALUES ('delete', old.id, old.name, old.details);
+        INSERT INTO {FTS_TABLE}(rowid, name, details) VALUES (new.id, new.name, new.details);
+    END
+    """,
+]
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+SQLITE_REBUILD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+# The query must use exactly this expression for PostgreSQL to pick the index
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(\"manager_product\".\"name\", '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(\"manager_product\".\"details\", '')), 'B')"
+)
+POSTGRES_INSTALL = [
+    f"CREATE INDEX IF NOT EXISTS manager_product_search_idx ON manager_product USING GIN (({POSTGRES_VECTOR}))",
+]
+POSTGRES_UNINSTALL = ["DROP INDEX IF EXISTS manager_product_search_idx"]
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install(connection):
+    """Create the search index (idempotent); returns True if it did not exist yet"""
+    if connection.vendor == 'sqlite':
+        existed = FTS_TABLE in connection.introspection.table_names()
+        _execute(connection, SQLITE_INSTALL)
+        if not existed:
+            rebuild(connection)
+        return not existed
+    if connection.vendor == 'postgresql':
+        _execute(connection, POSTGRES_INSTALL)
+    return False
+
+
+def uninstall(connection):
+    if connection.vendor == 'sqlite':
+        _execute(connection, SQLITE_UNINSTALL)
+    elif connection.vendor == 'postgresql':
+        _execute(connection, POSTGRES_UNINSTALL)
+
+
+def rebuild(connection):
+    """Re-read every product into the index (SQLite only; PostgreSQL needs nothing)"""
+    if connection.vendor == 'sqlite':
+        _execute(connection, [SQLITE_REBUILD])
+
+
+def search_terms(query):
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset to the products matching query, annotated with
+    search_rank (higher is better) and ordered by it.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        # bm25() is lower-is-better; negate it so every backend sorts descending
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = \"manager_product\".\"id\"",
+            [match], output_field=FloatField()
+        )
+        queryset = queryset.filter(pk__in=matches)
+    elif vendor == 'postgresql':
+        tsquery = ' & '.join(f"{term}:*" for term in terms)
+        matches = RawSQL(
+            f"({POSTGRES_VECTOR}) @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f"ts_rank({POSTGRES_VECTOR}, to_tsquery('simple', %s))",
+            [tsquery], output_field=FloatField()
+        )
+        queryset = queryset.filter(matches)
+    else:
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(details__icontains=term))
+        return queryset
+
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', 'pk')
+
+
+class SearchFilterMixin:
+    """FilterSet mixin for product filtersets whose search CharFilter uses method='filter_search'"""
+
+    def filter_search(self, queryset, name, value):
+        # Ranked full-text prefix search; a sort choice still overrides the rank order
+        return queryset.search(value)
@@ -0,0 +1,186 @@
+# seed.py
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Client, Installment, Invoice, InvoiceItem, Product, Warehouse, WarehouseProduct
+)
+
+
+class SeedData:
+    """
+    Synthetic catalog, stock and billing data for benchmarks and local testing.
+
+    Everything is written with bulk_create in batches, and the denormalized
+    invoice totals and amount_paid are computed up front so the rows look
+    exactly like ones created through the UI. The same seed and sizes always
+    produce the same data.
+    """
+    batch_size = 2000
+    image_path = 'products/main_images/seed.png'
+    history_days = 365
+
+    def __init__(self, products=1000, warehouses=5, clients=100, invoices=200,
+                 items_per_invoice=3, stock_per_product=2, seed=0):
+        self.products = products
+        self.warehouses = warehouses
+        self.clients = clients
+        self.invoices = invoices
+        self.items_per_invoice = items_per_invoice
+        self.stock_per_product = min(stock_per_product, warehouses)
+        self.random = random.Random(seed)
+        self.counts = {}
+
+    @classmethod
+    def for_scale(cls, scale, seed=0):
+        """Sizes proportional to the number of products"""
+        return cls(
+            products=scale,
+            warehouses=max(2, min(50, scale // 500)),
+            clients=max(10, scale // 10),
+            invoices=max(20, scale // 5),
+            seed=seed,
+        )
+
+    def bulk_create(self, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model._meta.model_name] = self.counts.get(model._meta.model_name, 0) + len(created)
+        return created
+
+    def money(self, low, high):
+        return Decimal(self.random.randint(low * 100, high * 100)) / 100
+
+    # Generators
+
+    def make_products(self):
+        categories = [value for value, label in Product.Category.choices]
+        products = []
+        for i in range(self.products):
+            # The name carries the category the product is saved under, so searches match it
+            category = self.random.choice(categories)
+            products.append(Product(
+                name=f"Seed {category} {i:06d}",
+                category=category,
+                price=self.money(5, 5000),
+                details="Generated by the seed_data command",
+                main_image=self.image_path,
+            ))
+        return self.bulk_create(Product, products)
+
+    def make_warehouses(self):
+        return self.bulk_create(Warehouse, [
+            Warehouse(name=f"Seed Warehouse {i:03d}", address=f"{i} Industrial Zone, Cairo")
+            for i in range(self.warehouses)
+        ])
+
+    def make_stock(self, products, warehouses):
+        rows = []
+        for product in products:
+            for warehouse in self.random.sample(warehouses, self.stock_per_product):
+                rows.append(WarehouseProduct(
+                    warehouse=warehouse, product=product, quantity=self.random.randint(0, 200)
+                ))
+            if len(rows) >= self.batch_size:
+                self.bulk_create(WarehouseProduct, rows)
+                rows = []
+        self.bulk_create(WarehouseProduct, rows)
+
+    def make_clients(self):
+        return self.bulk_create(Client, [
+            Client(
+                name=f"Seed Client {i:06d}",
+                address=f"{i} Street, Cairo",
+                phone=f"+20{1000000000 + i}",
+                email=f"client{i}@example.com" if i % 3 else None,
+            )
+            for i in range(self.clients)
+        ])
+
+    def make_invoices(self, products, clients):
+        """Invoices with their items and installments, totals already filled in"""
+        staff = list(User.objects.filter(is_staff=True).values_list('pk', flat=True)) or [None]
+        statuses = [value for value, label in Invoice.STATUS_CHOICES]
+        today = timezone.now().date()
+
+        for start in range(0, self.invoices, self.batch_size):
+            invoices, lines = [], []
+            for i in range(start, min(start + self.batch_size, self.invoices)):
+                status = self.random.choice(statuses)
+                invoice = Invoice(
+                    client=self.random.choice(clients),
+                    assigned_to_id=self.random.choice(staff),
+                    date_due=today + timedelta(days=self.random.randint(-120, 120)),
+                    tax_percentage=self.random.choice([Decimal('0'), Decimal('14')]),
+                    discount_amount=Decimal(self.random.choice([0, 0, 10, 50])),
+                    status=status,
+                    is_installment=status == Invoice.STATUS_INSTALLMENT,
+                )
+                count = self.random.randint(1, self.items_per_invoice * 2 - 1)
+                items = [
+                    InvoiceItem(invoice=invoice, product=product, unit_price=product.price,
+                                quantity=self.random.randint(1, 10))
+                    for product in self.random.sample(products, min(count, len(products)))
+                ]
+                invoice.calculated_subtotal = sum((item.total for item in items), Decimal('0.00'))
+                if invoice.discount_amount * 2 > invoice.calculated_subtotal:
+                    invoice.discount_amount = Decimal('0')
+                invoice.calculated_total = invoice.compute_total(invoice.calculated_subtotal)
+                if status == Invoice.STATUS_PAID:
+                    invoice.amount_paid = invoice.calculated_total
+                invoices.append(invoice)
+                lines.append(items)
+
+            installments = self.make_installments(invoices)
+            self.bulk_create(Invoice, invoices)
+            self.bulk_create(InvoiceItem, [item for items in lines for item in items])
+            self.bulk_create(Installment, installments)
+            self.backdate(invoices)
+
+    def make_installments(self, invoices):
+        """Installment plans for the (not yet saved) installment invoices; sets amount_paid"""
+        installments = []
+        for invoice in invoices:
+            if invoice.status != Invoice.STATUS_INSTALLMENT or invoice.calculated_total <= 0:
+                continue
+            parts = self.random.randint(2, 6)
+            amount = (invoice.calculated_total / parts).quantize(Decimal('0.01'))
+            paid_parts = self.random.randint(0, parts - 1)
+            for part in range(parts):
+                if part == parts - 1:
+                    amount = invoice.calculated_total - amount * (parts - 1)
+                installments.append(Installment(
+                    invoice=invoice,
+                    due_date=invoice.date_due + timedelta(days=30 * part),
+                    amount=amount,
+                    is_paid=part < paid_parts,
+                    payment_date=invoice.date_due + timedelta(days=30 * part) if part < paid_parts else None,
+                ))
+            invoice.amount_paid = sum(
+                (item.amount for item in installments[-parts:] if item.is_paid), Decimal('0.00')
+            )
+        return installments
+
+    def backdate(self, invoices):
+        """Spread creation dates over the last year (auto_now_add ignores assigned values)"""
+        by_day = {}
+        for invoice in invoices:
+            by_day.setdefault(self.random.randint(0, self.history_days), []).append(invoice.pk)
+        now = timezone.now()
+        for days, pks in by_day.items():
+            created = now - timedelta(days=days)
+            Invoice.objects.filter(pk__in=pks).update(date_created=created, last_edit_time=created)
+
+    def run(self):
+        """Generate everything; returns {model_name: rows created}"""
+        with transaction.atomic():
+            products = self.make_products()
+            warehouses = self.make_warehouses()
+            self.make_stock(products, warehouses)
+            clients = self.make_clients()
+            self.make_invoices(products, clients)
+        return self.counts
@@ -0,0 +1,32 @@
+# storage.py
+"""
+Storage for files that must not be reachable through MEDIA_URL.
+
+Finished exports hold client and invoice data, so they are written under
+settings.PRIVATE_MEDIA_ROOT (outside MEDIA_ROOT and never served by the
+web server) and only handed out by the login-protected
+export_job_download view.
+"""
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+@deconstructible(path='manager.storage.PrivateStorage')
+class PrivateStorage(FileSystemStorage):
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.PRIVATE_MEDIA_ROOT)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == 'PRIVATE_MEDIA_ROOT':
+            self.__dict__.pop('base_location', None)
+            self.__dict__.pop('location', None)
+
+    def url(self, name):
+        raise ValueError("Private files have no public URL; serve them through a view")
+
+
+private_storage = PrivateStorage()
@@ -0,0 +1,235 @@
+"""
+Query-count budgets for every named URL in manager/urls.py and sales/urls.py.
+
+Each page is rendered against a small data set and again after the data has
+grown (more rows on every list and more children on every detail object).
+The query count must not change between the two, and must stay within the
+budget recorded in QUERY_BUDGETS. A new URL has to be added to the table,
+so an N+1 fails here instead of showing up in production.
+"""
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from manager import urls as manager_urls
+from sales import urls as sales_urls
+
+from .autocomplete import product_index
+from .models import (
+    Client, ExportJob, Installment, Invoice, InvoiceItem, Product, ProductImage, Warehouse,
+    WarehouseProduct
+)
+from .seed import SeedData
+
+User = get_user_model()
+
+
+# name: (method, expected status, queries allowed), the budget including the
+# session and user lookups. Lower a budget when a page gets cheaper; raising
+# one needs a reason. Request data comes from url_params().
+QUERY_BUDGETS = {
+    # manager
+    'product_list': ('GET', 200, 4),
+    'product_create': ('GET', 200, 2),
+    'add_image_field': ('GET', 200, 2),
+    'product_autocomplete': ('GET', 200, 3),
+    'product_detail': ('GET', 200, 6),
+    'product_update': ('GET', 200, 4),
+    'warehouse_list': ('GET', 200, 3),
+    'warehouse_create': ('GET', 200, 2),
+    'warehouse_detail': ('GET', 200, 5),
+    'warehouse_update': ('GET', 200, 3),
+    'warehouse_summary': ('GET', 200, 3),
+    'warehouse_detail_summary': ('GET', 200, 3),
+    'warehouse_stock_export': ('GET', 200, 3),
+    'warehouseproduct_create': ('GET', 200, 5),
+    'warehouseproduct_update': ('GET', 200, 3),
+    'stock_import': ('GET', 200, 2),
+    'client_list': ('GET', 200, 4),
+    'client_create': ('GET', 200, 2),
+    'client_detail': ('GET', 200, 4),
+    'client_update': ('GET', 200, 3),
+    'client_export': ('GET', 200, 3),
+    'invoice_list': ('GET', 200, 5),
+    'invoice_create': ('GET', 200, 4),
+    'invoice_detail': ('GET', 200, 5),
+    'invoice_update': ('GET', 200, 7),
+    'invoice_export': ('GET', 200, 3),
+    'invoice_item_export': ('GET', 200, 3),
+    # lookup, then a savepoint around the locked subtotal read, item check and update
+    'mark_invoice_paid': ('POST', 200, 8),
+    # Installment.pay: savepoint pair, locking read and two updates
+    'mark_installment_paid': ('POST', 200, 7),
+    # reuse check and insert
+    'export_job_create': ('POST', 200, 4),
+    'export_job_status': ('GET', 200, 3),
+    'export_job_download': ('GET', 200, 3),
+    # session, user, refresh state, eight report queries
+    'reports': ('GET', 200, 11),
+    # sales
+    'Home': ('GET', 200, 1),
+    'All_products': ('GET', 200, 2),
+    'Moving_dashboard': ('GET', 200, 2),
+    'Led_par_dashboard': ('GET', 200, 2),
+    'Smoke_dashboard': ('GET', 200, 2),
+    'Controlls_dashboard': ('GET', 200, 2),
+    'Laser_Beam_dashboard': ('GET', 200, 2),
+    'Lamps_dashboard': ('GET', 200, 2),
+    'Truss_dashboard': ('GET', 200, 2),
+    'Led_Screens_dashboard': ('GET', 200, 2),
+    'Accessories_dashboard': ('GET', 200, 2),
+    'services': ('GET', 200, 1),
+    'contact': ('GET', 200, 1),
+    'About_us': ('GET', 200, 1),
+    'product_details_copy': ('GET', 200, 5),
+}
+
+# Pages known to grow with their rows, and why. The equality check is skipped
+# for these (the budget still applies to the small data set); remove the
+# entry once the page is fixed.
+KNOWN_N_PLUS_ONE = {}
+
+
+def named_urls(urlconf):
+    return [
+        pattern.name for pattern in urlconf.urlpatterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    ]
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Finished exports are written to disk; every export request starts a new job
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root)
+        override = override_settings(PRIVATE_MEDIA_ROOT=media_root, EXPORT_CACHE_TTL=0)
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        SeedData(products=8, warehouses=2, clients=3, invoices=6, seed=1).run()
+        # One product per category, so no catalog page starts out empty
+        Product.objects.bulk_create([
+            Product(name=f"Only {value}", category=value, price=Decimal('10.00'), main_image=SeedData.image_path)
+            for value, label in Product.Category.choices
+        ])
+
+        cls.product = Product.objects.order_by('pk').first()
+        cls.warehouse = Warehouse.objects.order_by('pk').first()
+        cls.client_obj = Client.objects.order_by('pk').first()
+        cls.invoice = Invoice.objects.create(
+            client=cls.client_obj,
+            date_due=date(2030, 1, 1),
+            status=Invoice.STATUS_INSTALLMENT,
+        )
+        InvoiceItem.objects.create(invoice=cls.invoice, product=cls.product, quantity=1)
+        # Two, so paying one in the small run does not settle the invoice
+        for month in (1, 2):
+            Installment.objects.create(invoice=cls.invoice, due_date=date(2030, month, 1), amount=Decimal('1.00'))
+        cls.stock = WarehouseProduct.objects.filter(warehouse=cls.warehouse).first()
+        cls.job = ExportJob.objects.create(export_name='clients', params={}, requested_by=cls.user)
+        cls.finished_job = ExportJob.objects.create(export_name='clients', params={}, requested_by=cls.user)
+        cls.finished_job.run()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def url_kwargs(self):
+        return {
+            'product_detail': {'pk': self.product.pk},
+            'product_update': {'pk': self.product.pk},
+            'warehouse_detail': {'pk': self.warehouse.pk},
+            'warehouse_update': {'pk': self.warehouse.pk},
+            'warehouse_detail_summary': {'pk': self.warehouse.pk},
+            'warehouseproduct_create': {'warehouse_id': self.warehouse.pk},
+            'warehouseproduct_update': {'pk': self.stock.pk},
+            'client_detail': {'pk': self.client_obj.pk},
+            'client_update': {'pk': self.client_obj.pk},
+            'invoice_detail': {'pk': self.invoice.pk},
+            'invoice_update': {'pk': self.invoice.pk},
+            'mark_invoice_paid': {'pk': self.invoice.pk},
+            'mark_installment_paid': {
+                'pk': self.invoice.installments.filter(is_paid=False).order_by('pk').first().pk
+            },
+            'export_job_create': {'export_name': 'clients'},
+            'export_job_status': {'pk': self.job.pk},
+            'export_job_download': {'pk': self.finished_job.pk},
+            'product_details_copy': {'product_id': self.product.pk},
+        }
+
+    def url_params(self):
+        return {
+            'product_autocomplete': {'q': 'seed'},
+            'client_list': {'sort': '-lifetime_value'},
+        }
+
+    def grow(self):
+        """Add rows everywhere, including children of the objects the detail pages show"""
+        SeedData(products=60, warehouses=3, clients=30, invoices=40, seed=2).run()
+        new_products = list(Product.objects.exclude(
+            pk__in=self.warehouse.warehouse_products.values('product_id')
+        )[:20])
+        WarehouseProduct.objects.bulk_create([
+            WarehouseProduct(warehouse=self.warehouse, product=product, quantity=3)
+            for product in new_products
+        ])
+        for product in new_products[:10]:
+            InvoiceItem.objects.create(invoice=self.invoice, product=product, quantity=2)
+            Installment.objects.create(invoice=self.invoice, due_date=date(2030, 2, 1), amount=Decimal('1.00'))
+        ProductImage.objects.bulk_create([
+            ProductImage(product=self.product, image='products/images/seed.png') for _ in range(5)
+        ])
+        Invoice.objects.filter(pk__in=Invoice.objects.order_by('-pk').values('pk')[:15]).update(
+            client=self.client_obj
+        )
+
+    def count_queries(self, name, kwargs, params):
+        method, status, _ = QUERY_BUDGETS[name]
+        # Measure cold: no cached pages and no in-process indexes
+        for cache in caches.all():
+            cache.clear()
+        product_index.invalidate()
+        send = self.client.post if method == 'POST' else self.client.get
+        with CaptureQueriesContext(connection) as queries:
+            response = send(reverse(name, kwargs=kwargs.get(name)), params.get(name))
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status, f"{method} {name}")
+        return len(queries)
+
+    def measure_all(self):
+        kwargs, params = self.url_kwargs(), self.url_params()
+        return {name: self.count_queries(name, kwargs, params) for name in QUERY_BUDGETS}
+
+    def test_every_named_url_has_a_budget(self):
+        names = set(named_urls(manager_urls) + named_urls(sales_urls))
+        self.assertEqual(names - set(QUERY_BUDGETS), set(), "Add these URLs to QUERY_BUDGETS")
+        self.assertEqual(set(QUERY_BUDGETS) - names, set(), "Remove these URLs from QUERY_BUDGETS")
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        small = self.measure_all()
+        self.grow()
+        large = self.measure_all()
+
+        for name, (_, _, budget) in QUERY_BUDGETS.items():
+            with self.subTest(url=name):
+                if name in KNOWN_N_PLUS_ONE:
+                    self.assertLessEqual(small[name], budget, f"{name} is over its query budget")
+                    continue
+                self.assertEqual(
+                    small[name], large[name],
+                    f"{name}: {small[name]} queries with little data, {large[name]} with more (N+1?)"
+                )
+                self.assertLessEqual(large[name], budget, f"{name} is over its query budget")
@@ -1,3 +1,834 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from moonstar import routers
+from moonstar.database import configure_sqlite, database_config
+from moonstar.middleware import ReplicaRoutingMiddleware
+
+from . import images, reports
+from .autocomplete import product_index
+from .forms import InvoiceItemFormSet
+from .imports import StockImport, StockImportError
+from .management.commands.view_metrics_report import percentile
+from .models import (
+    Client, DerivativeStatus, ExportJob, Installment, Invoice, InvoiceItem, Product, ProductImage,
+    StockMovement, Warehouse, WarehouseProduct,
+)
+from .seed import SeedData
+
+User = get_user_model()
+
+
+class InvoiceDetailQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        cls.client_obj = Client.objects.create(name='Client', address='Cairo', phone='+201000000000')
+        cls.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                price=Decimal('10.00') + i,
+                main_image='products/main_images/test.png'
+            )
+            for i in range(12)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def make_invoice(self, item_count):
+        invoice = Invoice.objects.create(
+            client=self.client_obj,
+            assigned_to=self.user,
+            date_due=date(2030, 1, 1),
+            tax_percentage=Decimal('14'),
+            status=Invoice.STATUS_INSTALLMENT,
+        )
+        for product in self.products[:item_count]:
+            InvoiceItem.objects.create(invoice=invoice, product=product, quantity=2)
+        for month in range(1, item_count + 1):
+            Installment.objects.create(invoice=invoice, due_date=date(2030, month, 1), amount=Decimal('5.00'))
+        return invoice
+
+    def count_queries(self, invoice):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('invoice_detail', kwargs={'pk': invoice.pk}))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_items(self):
+        small = self.count_queries(self.make_invoice(1))
+        large = self.count_queries(self.make_invoice(12))
+        self.assertEqual(small, large)
+
+    def test_totals_match_items(self):
+        invoice = self.make_invoice(3)
+        response = self.client.get(reverse('invoice_detail', kwargs={'pk': invoice.pk}))
+        shown = response.context['invoice']
+        expected_subtotal = sum((item.total for item in invoice.items.all()), Decimal('0.00'))
+        self.assertEqual(shown.subtotal, expected_subtotal)
+        self.assertEqual(shown.total, shown.compute_total(expected_subtotal))
+
+
+class InvoiceTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        client_obj = Client.objects.create(name='Client', address='Cairo', phone='+201000000000')
+        cls.beam = Product.objects.create(name='Beam', price=Decimal('10.00'), main_image='x.png')
+        cls.hazer = Product.objects.create(name='Hazer', price=Decimal('5.00'), main_image='x.png')
+        cls.invoice = Invoice.objects.create(client=client_obj, date_due=date(2030, 1, 1))
+
+    def stored(self):
+        return Invoice.objects.values_list('calculated_subtotal', 'calculated_total').get(pk=self.invoice.pk)
+
+    def test_item_add_edit_and_delete_keep_totals(self):
+        item = InvoiceItem.objects.create(invoice=self.invoice, product=self.beam, quantity=2)
+        other = InvoiceItem.objects.create(invoice=self.invoice, product=self.hazer, quantity=1)
+        self.assertEqual(self.stored(), (Decimal('25.00'), Decimal('25.00')))
+        item.quantity = 3
+        item.save()
+        self.assertEqual(self.stored(), (Decimal('35.00'), Decimal('35.00')))
+        other.delete()
+        self.assertEqual(self.stored(), (Decimal('30.00'), Decimal('30.00')))
+
+    def test_tax_and_discount_change_rederive_total(self):
+        InvoiceItem.objects.create(invoice=self.invoice, product=self.beam, quantity=10)
+        invoice = Invoice.objects.get(pk=self.invoice.pk)
+        invoice.tax_percentage = Decimal('14')
+        invoice.discount_amount = Decimal('4.00')
+        invoice.save()
+        self.assertEqual(self.stored(), (Decimal('100.00'), Decimal('110.00')))
+
+    def test_saving_a_stale_instance_keeps_item_changes(self):
+        InvoiceItem.objects.create(invoice=self.invoice, product=self.beam, quantity=2)
+        stale = Invoice.objects.get(pk=self.invoice.pk)
+        InvoiceItem.objects.create(invoice=self.invoice, product=self.hazer, quantity=1)
+        stale.notes = 'Edited elsewhere'
+        stale.save()
+        self.assertEqual(self.stored(), (Decimal('25.00'), Decimal('25.00')))
+        self.assertEqual(stale.total, Decimal('25.00'))
+
+    def test_rebuild_check_reports_drift(self):
+        InvoiceItem.objects.create(invoice=self.invoice, product=self.beam, quantity=2)
+        call_command('rebuild_invoice_totals', '--check', stdout=StringIO())
+        Invoice.objects.filter(pk=self.invoice.pk).update(calculated_subtotal=Decimal('1.00'))
+        with self.assertRaisesMessage(CommandError, '1 of 1 invoices have stale totals'):
+            call_command('rebuild_invoice_totals', '--check', stdout=StringIO())
+        call_command('rebuild_invoice_totals', stdout=StringIO())
+        self.assertEqual(self.stored(), (Decimal('20.00'), Decimal('20.00')))
+
+
+class InvoiceSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x')
+        cls.client_obj = Client.objects.create(name='Client', address='Cairo', phone='+201000000000')
+        beam = Product.objects.create(name='Beam', price=Decimal('100.00'), main_image='x.png')
+        past_due = date(2020, 1, 1)
+        for status in (
+            Invoice.STATUS_DRAFT, Invoice.STATUS_SENT, Invoice.STATUS_INSTALLMENT, Invoice.STATUS_CANCELLED,
+        ):
+            invoice = Invoice.objects.create(client=cls.client_obj, date_due=past_due, status=status)
+            InvoiceItem.objects.create(invoice=invoice, product=beam, quantity=1)
+        Invoice.objects.filter(status=Invoice.STATUS_INSTALLMENT).update(amount_paid=Decimal('40.00'))
+        # An empty invoice cannot be saved as paid, so add the items first
+        paid = Invoice.objects.create(client=cls.client_obj, date_due=past_due)
+        InvoiceItem.objects.create(invoice=paid, product=beam, quantity=1)
+        paid.status = Invoice.STATUS_PAID
+        paid.save()
+
+    def test_totals_skip_drafts_and_cancelled(self):
+        totals, rows = Invoice.objects.summary_by_status(date(2030, 1, 1))
+        self.assertEqual(totals['count'], 5)
+        self.assertEqual(totals['billed'], Decimal('300.00'))
+        self.assertEqual(totals['paid'], Decimal('140.00'))
+        self.assertEqual(totals['outstanding'], Decimal('160.00'))
+        self.assertEqual((totals['overdue_count'], totals['overdue_amount']), (2, Decimal('160.00')))
+        # The breakdown still lists drafts with their own amounts
+        draft = next(row for row in rows if row['status'] == Invoice.STATUS_DRAFT)
+        self.assertEqual((draft['billed'], draft['overdue_count']), (Decimal('100.00'), 0))
+
+        stats = Client.objects.with_lifetime_stats().get(pk=self.client_obj.pk)
+        self.assertEqual(
+            (totals['billed'], totals['paid'], totals['outstanding']),
+            (stats.lifetime_billed, stats.lifetime_paid, stats.lifetime_outstanding),
+        )
+
+    def test_invoice_list_cards_match(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('invoice_list'))
+        self.assertEqual(response.context['total_amount'], Decimal('300.00'))
+        self.assertEqual(response.context['outstanding_amount'], Decimal('160.00'))
+
+
+class InstallmentPaymentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        client_obj = Client.objects.create(name='Client', address='Cairo', phone='+201000000000')
+        product = Product.objects.create(name='Beam', price=Decimal('50.00'), main_image='products/main_images/test.png')
+        cls.invoice = Invoice.objects.create(
+            client=client_obj,
+            date_due=date(2030, 1, 1),
+            status=Invoice.STATUS_INSTALLMENT,
+        )
+        InvoiceItem.objects.create(invoice=cls.invoice, product=product, quantity=2)
+        cls.first = Installment.objects.create(invoice=cls.invoice, due_date=date(2030, 1, 1), amount=Decimal('40.00'))
+        cls.second = Installment.objects.create(invoice=cls.invoice, due_date=date(2030, 2, 1), amount=Decimal('60.00'))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def pay(self, installment):
+        return self.client.post(reverse('mark_installment_paid', kwargs={'pk': installment.pk})).json()
+
+    def test_paying_twice_does_not_double_count(self):
+        self.assertEqual(self.pay(self.first)['status'], 'success')
+        self.assertEqual(self.pay(self.first)['status'], 'error')
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('40.00'))
+        self.assertEqual(self.invoice.status, Invoice.STATUS_INSTALLMENT)
+
+    def test_last_installment_marks_invoice_paid(self):
+        self.pay(self.first)
+        self.assertEqual(self.pay(self.second)['invoice_status'], Invoice.STATUS_PAID)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.amount_paid, Decimal('100.00'))
+        self.assertEqual(self.invoice.balance_due, Decimal('0.00'))
+
+    def test_payment_query_count_is_fixed(self):
+        # One locking read and two updates, plus the savepoint pair
+        with self.assertNumQueries(5):
+            Installment.pay(self.first.pk)
+
+
+class SeedDataTests(TestCase):
+    def test_seeded_invoices_are_consistent(self):
+        counts = SeedData(products=50, warehouses=3, clients=10, invoices=40, seed=1).run()
+        self.assertEqual(counts['product'], 50)
+        self.assertEqual(counts['warehouseproduct'], 100)
+        self.assertEqual(counts['invoice'], 40)
+
+        for invoice in Invoice.objects.prefetch_related('items', 'installments'):
+            self.assertFalse(invoice.recalculate_totals(), f"Invoice #{invoice.pk} has stale totals")
+            if invoice.status == Invoice.STATUS_INSTALLMENT:
+                paid = invoice.installments.filter(is_paid=True).aggregate(total=Sum('amount'))['total']
+                self.assertEqual(invoice.amount_paid, paid or Decimal('0.00'))
+                self.assertEqual(
+                    sum(item.amount for item in invoice.installments.all()), invoice.calculated_total
+                )
+
+
+class StockLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        cls.warehouse = Warehouse.objects.create(name='Main', address='Cairo')
+        cls.product = Product.objects.create(name='Beam', price=Decimal('10.00'), main_image='x.png')
+
+    def stock(self):
+        return WarehouseProduct.objects.get(warehouse=self.warehouse, product=self.product)
+
+    def ledger_total(self):
+        return StockMovement.objects.filter(
+            warehouse=self.warehouse, product=self.product
+        ).aggregate(total=Sum('change'))['total']
+
+    def test_receive_increments_in_sql_and_records_the_receipt(self):
+        self.assertTrue(WarehouseProduct.receive(self.warehouse, self.product, 4, user=self.user))
+        stale = self.stock()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(WarehouseProduct.receive(self.warehouse, self.product, 3))
+        self.assertIn('"quantity" + 3', ' '.join(query['sql'] for query in queries))
+        # A receipt never depends on the quantity a caller loaded earlier
+        self.assertEqual(stale.quantity, 4)
+        self.assertEqual(self.stock().quantity, 7)
+        self.assertEqual(
+            list(StockMovement.objects.order_by('pk').values_list('change', 'reason', 'created_by')),
+            [(4, StockMovement.REASON_RECEIPT, self.user.pk), (3, StockMovement.REASON_RECEIPT, None)],
+        )
+
+    def test_set_quantity_records_the_difference(self):
+        WarehouseProduct.receive(self.warehouse, self.product, 10)
+        stock = self.stock()
+        stock.set_quantity(6, user=self.user)
+        stock.set_quantity(6)
+        self.assertEqual(self.stock().quantity, 6)
+        movement = StockMovement.objects.latest('pk')
+        self.assertEqual((movement.change, movement.reason), (-4, StockMovement.REASON_ADJUSTMENT))
+        self.assertEqual(StockMovement.objects.count(), 2)
+
+    def test_negative_stock_is_rejected(self):
+        WarehouseProduct.receive(self.warehouse, self.product, 2)
+        with self.assertRaises(ValueError):
+            self.stock().set_quantity(-1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            WarehouseProduct.receive(self.warehouse, self.product, -5)
+        self.assertEqual(self.stock().quantity, 2)
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+    def test_stock_equals_the_sum_of_the_ledger(self):
+        WarehouseProduct.receive(self.warehouse, self.product, 5)
+        WarehouseProduct.receive(self.warehouse, self.product, 8)
+        self.stock().set_quantity(9)
+        WarehouseProduct.receive(self.warehouse, self.product, 1)
+        self.assertEqual(self.stock().quantity, 10)
+        self.assertEqual(self.ledger_total(), 10)
+
+
+def csv_upload(text, name='stock.csv', encoding='utf-8'):
+    return SimpleUploadedFile(name, text.encode(encoding), content_type='text/csv')
+
+
+class StockImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        cls.warehouse = Warehouse.objects.create(name='Main', address='Cairo')
+        cls.beam = Product.objects.create(name='Beam', price=Decimal('10.00'), main_image='x.png')
+        cls.hazer = Product.objects.create(name='Hazer', price=Decimal('5.00'), main_image='x.png')
+        cls.stock = WarehouseProduct.objects.create(warehouse=cls.warehouse, product=cls.beam, quantity=10)
+
+    def run_import(self, text, **kwargs):
+        stock_import = StockImport.from_file(csv_upload(text), 'stock.csv', **kwargs)
+        return stock_import, stock_import.run()
+
+    def quantities(self):
+        return dict(WarehouseProduct.objects.values_list('product__name', 'quantity'))
+
+    def test_missing_columns_are_reported(self):
+        stock_import, applied = self.run_import("warehouse,product\nMain,Beam\n")
+        self.assertFalse(applied)
+        self.assertEqual(stock_import.errors, ["Missing column(s): quantity"])
+
+    def test_unknown_product_and_warehouse_rows_are_reported(self):
+        stock_import, applied = self.run_import(
+            "warehouse,product,quantity\nMain,Strobe,1\nAnnex,Beam,1\n"
+        )
+        self.assertFalse(applied)
+        self.assertEqual(stock_import.errors, ["Row 2: Unknown product 'Strobe'", "Row 3: Unknown warehouse 'Annex'"])
+
+    def test_set_and_add_modes(self):
+        stock_import, applied = self.run_import(
+            f"warehouse,product,quantity,mode\nMain,Beam,5,add\n{self.warehouse.pk},{self.hazer.pk},7,set\n"
+        )
+        self.assertTrue(applied)
+        self.assertEqual(stock_import.summary, "1 created, 1 updated, 0 unchanged")
+        self.assertEqual(self.quantities(), {'Beam': 15, 'Hazer': 7})
+        self.assertEqual(
+            sorted(StockMovement.objects.values_list('product__name', 'change', 'reason')),
+            [('Beam', 5, StockMovement.REASON_IMPORT), ('Hazer', 7, StockMovement.REASON_IMPORT)],
+        )
+
+    def test_one_invalid_row_rolls_back_the_whole_sheet(self):
+        stock_import, applied = self.run_import(
+            "warehouse,product,quantity,mode\nMain,Hazer,3,set\nMain,Beam,-20,add\n"
+        )
+        self.assertFalse(applied)
+        self.assertEqual(stock_import.errors, ["Row 3: Adding this quantity would make the stock negative"])
+        self.assertEqual(self.quantities(), {'Beam': 10})
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_unreadable_files_raise_import_errors(self):
+        with self.assertRaisesMessage(StockImportError, "not UTF-8"):
+            StockImport.from_file(csv_upload("warehouse,product,quantity\nMain,Café,1\n", encoding='cp1252'))
+        with self.assertRaisesMessage(StockImportError, "Row 2"):
+            StockImport.from_file(csv_upload('warehouse,product,quantity\n"Main,Beam,1\n'))
+        with self.assertRaises(StockImportError):
+            StockImport.from_file(SimpleUploadedFile('stock.xlsx', b'not a workbook'), 'stock.xlsx')
+        with self.assertRaisesMessage(StockImportError, "Row 3: 4 values but the header has 3 columns"):
+            StockImport.from_file(csv_upload("warehouse,product,quantity\nMain,Beam,1\nMain,Beam,1,extra\n"))
+
+    def test_view_and_command_report_undecodable_files(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('stock_import'), {
+            'file': csv_upload("warehouse,product,quantity\nMain,Café,1\n", encoding='cp1252'),
+            'mode': 'set',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("not UTF-8", response.context['form'].errors['file'][0])
+
+        path = os.path.join(tempfile.mkdtemp(), 'stock.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'wb') as file:
+            file.write("warehouse,product,quantity\nMain,Café,1\n".encode('cp1252'))
+        with self.assertRaisesMessage(CommandError, "not UTF-8"):
+            call_command('import_stock', path, stdout=StringIO())
+
+        response = self.client.post(reverse('stock_import'), {
+            'file': csv_upload("warehouse,product,quantity\nMain,Beam,1,extra\n"), 'mode': 'set',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Row 2", response.context['form'].errors['file'][0])
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.roots = {}
+        for setting in ('MEDIA_ROOT', 'PRIVATE_MEDIA_ROOT'):
+            self.roots[setting] = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, self.roots[setting])
+        override = override_settings(**self.roots)
+        override.enable()
+        self.addCleanup(override.disable)
+        Client.objects.create(name='Client', address='Cairo', phone='+201000000000')
+
+    def test_finished_exports_are_private(self):
+        job, _ = ExportJob.request('clients', {})
+        self.assertTrue(job.run())
+        # The same export run again gets a different, random file name
+        other = ExportJob.objects.create(export_name='clients', params={})
+        other.run()
+
+        self.assertTrue(os.path.exists(os.path.join(self.roots['PRIVATE_MEDIA_ROOT'], job.file.name)))
+        self.assertEqual(os.listdir(self.roots['MEDIA_ROOT']), [])
+        self.assertNotEqual(job.file.name.rsplit('_', 1)[-1], other.file.name.rsplit('_', 1)[-1])
+        with self.assertRaises(ValueError):
+            job.file.url
+
+        url = reverse('export_job_download', kwargs={'pk': job.pk})
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(User.objects.create_user(username='yousef', password='x', is_staff=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Client', b''.join(response.streaming_content))
+
+    def test_worker_deletes_expired_exports_and_their_files(self):
+        expired, _ = ExportJob.request('clients', {})
+        expired.run()
+        long_ago = timezone.now() - timedelta(seconds=settings.EXPORT_CACHE_TTL + 1)
+        ExportJob.objects.filter(pk=expired.pk).update(created_at=long_ago, finished_at=long_ago)
+        pending = ExportJob.objects.create(export_name='clients', params={'search': 'x'})
+        ExportJob.objects.filter(pk=pending.pk).update(created_at=long_ago)
+        fresh = ExportJob.objects.create(export_name='clients', params={})
+        fresh.run()
+        expired_path = os.path.join(self.roots['PRIVATE_MEDIA_ROOT'], expired.file.name)
+        self.assertTrue(os.path.exists(expired_path))
+
+        call_command('run_export_jobs', '--once', stdout=StringIO())
+
+        self.assertFalse(os.path.exists(expired_path))
+        self.assertFalse(ExportJob.objects.filter(pk=expired.pk).exists())
+        # A job queued long ago but only just finished keeps its file for the full TTL
+        pending.refresh_from_db()
+        self.assertEqual(pending.status, ExportJob.STATUS_DONE)
+        self.assertTrue(os.path.exists(os.path.join(self.roots['PRIVATE_MEDIA_ROOT'], fresh.file.name)))
+        self.assertEqual(ExportJob.purge_expired(), 0)
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        image = 'products/main_images/test.png'
+        cls.beam = Product.objects.create(name='Sharpy Beam 230', price=Decimal('900.00'), main_image=image)
+        cls.wash = Product.objects.create(
+            name='Wash Zoom', price=Decimal('700.00'), details='Pairs well with a beam', main_image=image
+        )
+        cls.smoke = Product.objects.create(name='Hazer', price=Decimal('300.00'), main_image=image)
+
+    def names(self, query):
+        return list(Product.objects.search(query).values_list('name', flat=True))
+
+    def test_prefix_match_ranks_name_above_details(self):
+        self.assertEqual(self.names('bea'), ['Sharpy Beam 230', 'Wash Zoom'])
+        self.assertEqual(self.names('sharpy 23'), ['Sharpy Beam 230'])
+        self.assertEqual(self.names('"*) OR ('), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.smoke.name = 'Fog Machine'
+        self.smoke.save()
+        self.assertEqual(self.names('fog'), ['Fog Machine'])
+        self.assertEqual(self.names('hazer'), [])
+        self.beam.delete()
+        self.assertEqual(self.names('sharpy'), [])
+
+    def test_both_product_filters_use_the_index(self):
+        user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        self.client.force_login(user)
+        response = self.client.get(reverse('product_list'), {'name': 'zoo'})
+        self.assertEqual([p.name for p in response.context['products']], ['Wash Zoom'])
+        response = self.client.get(reverse('All_products'), {'search': 'beam'})
+        self.assertEqual([p.name for p in response.context['product']], ['Sharpy Beam 230', 'Wash Zoom'])
+
+
+class ProductAutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        image = 'products/main_images/test.png'
+        cls.beam = Product.objects.create(name='Sharpy Beam 230', price=Decimal('900.00'), main_image=image)
+        Product.objects.create(name='Beam Clamp', price=Decimal('15.00'), main_image=image)
+        Product.objects.create(name='Hazer', price=Decimal('300.00'), main_image=image)
+
+    def setUp(self):
+        # Test rollbacks send no signals, so start every test from a fresh index
+        product_index.invalidate()
+        self.client.force_login(self.user)
+
+    def search(self, query):
+        response = self.client.get(reverse('product_autocomplete'), {'q': query})
+        return [product['name'] for product in response.json()['results']]
+
+    def test_prefix_matches_with_leading_matches_first(self):
+        self.assertEqual(self.search('bea'), ['Beam Clamp', 'Sharpy Beam 230'])
+        self.assertEqual(self.search('sharpy 2'), ['Sharpy Beam 230'])
+        self.assertEqual(self.search(''), [])
+
+    def test_limit_is_clamped(self):
+        Product.objects.bulk_create([
+            Product(name=f'Beam {i}', price=Decimal('10.00'), main_image='x.png') for i in range(30)
+        ])
+        product_index.invalidate()
+        url = reverse('product_autocomplete')
+        for limit, expected in [('-3', 1), ('0', 1), ('abc', 10), ('', 10), ('2.5', 10), ('500', 20), ('5', 5)]:
+            with self.subTest(limit=limit):
+                response = self.client.get(url, {'q': 'beam', 'limit': limit})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()['results']), expected)
+
+    def test_index_is_rebuilt_after_product_changes(self):
+        self.assertEqual(self.search('fog'), [])
+        Product.objects.create(name='Fog Machine', price=Decimal('200.00'), main_image='x.png')
+        self.assertEqual(self.search('fog'), ['Fog Machine'])
+        self.beam.delete()
+        self.assertEqual(self.search('sharpy'), [])
+
+    def test_item_form_renders_only_the_chosen_product(self):
+        invoice = Invoice.objects.create(
+            client=Client.objects.create(name='Client', address='Cairo', phone='+201000000000'),
+            date_due=date(2030, 1, 1),
+        )
+        InvoiceItem.objects.create(invoice=invoice, product=self.beam, quantity=1)
+        response = self.client.get(reverse('invoice_update', kwargs={'pk': invoice.pk}))
+        self.assertContains(response, 'Sharpy Beam 230')
+        self.assertNotContains(response, 'Hazer')
+
+
+class InvoiceItemFormSetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        client_obj = Client.objects.create(name='Client', address='Cairo', phone='+201000000000')
+        cls.products = [
+            Product.objects.create(name=f"Product {i}", price=Decimal('10.00') + i, main_image='x.png')
+            for i in range(6)
+        ]
+        cls.small = Invoice.objects.create(client=client_obj, date_due=date(2030, 1, 1))
+        cls.large = Invoice.objects.create(client=client_obj, date_due=date(2030, 1, 1))
+        InvoiceItem.objects.create(invoice=cls.small, product=cls.products[0], quantity=1)
+        for product in cls.products:
+            InvoiceItem.objects.create(invoice=cls.large, product=product, quantity=1)
+
+    def render_queries(self, invoice):
+        with CaptureQueriesContext(connection) as queries:
+            str(InvoiceItemFormSet(instance=invoice))
+        return len(queries)
+
+    def test_render_cost_does_not_depend_on_line_count(self):
+        self.assertEqual(self.render_queries(self.small), self.render_queries(self.large))
+
+    def test_initial_product_sets_unit_price_from_shared_map(self):
+        product = self.products[3]
+        formset = InvoiceItemFormSet(instance=Invoice(), initial=[{'product': product.pk}])
+        self.assertEqual(formset.forms[0].fields['unit_price'].initial, product.price)
+        self.assertIs(formset.forms[0].fields['product'].products, formset.products)
+
+
+def png_upload(name, size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_worker_generates_every_size_and_format(self):
+        product = Product.objects.create(name='Beam', price=Decimal('10.00'), main_image=png_upload('beam.png'))
+        ProductImage.objects.create(product=product, image=png_upload('side.png', (100, 50)))
+        self.assertFalse(product.main_image_derivatives.ready)
+        self.assertEqual(product.main_image_derivatives.card['webp'], product.main_image.url)
+
+        call_command('run_image_worker', '--once', stdout=StringIO())
+
+        product = Product.objects.get(pk=product.pk)
+        self.assertEqual(product.main_image_status, DerivativeStatus.DONE)
+        self.assertTrue(images.exists(product.main_image))
+        with product.main_image.storage.open(images.derivative_name(product.main_image.name, 'card', 'jpeg')) as f:
+            self.assertEqual(Image.open(f).size, (480, 240))
+        self.assertIn('1200w', product.main_image_derivatives.srcset['webp'])
+        # Small originals are not upscaled
+        extra = product.images.get()
+        self.assertEqual(extra.image_status, DerivativeStatus.DONE)
+        with extra.image.storage.open(images.derivative_name(extra.image.name, 'detail', 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (100, 50))
+
+    def test_replacing_the_image_queues_it_again(self):
+        product = Product.objects.create(name='Beam', price=Decimal('10.00'), main_image=png_upload('beam.png'))
+        call_command('run_image_worker', '--once', stdout=StringIO())
+
+        product = Product.objects.get(pk=product.pk)
+        product.price = Decimal('12.00')
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).main_image_status, DerivativeStatus.DONE)
+
+        product.main_image = png_upload('beam2.png')
+        product.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).main_image_status, DerivativeStatus.PENDING)
+
+    def test_backfill_regenerates_missing_files(self):
+        product = Product.objects.create(name='Beam', price=Decimal('10.00'), main_image=png_upload('beam.png'))
+        Product.objects.filter(pk=product.pk).update(main_image_status=DerivativeStatus.DONE)
+
+        call_command('backfill_image_derivatives', stdout=StringIO())
+        self.assertTrue(images.exists(product.main_image))
+
+    def test_same_stem_uploads_keep_separate_derivatives(self):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 600), (30, 30, 200)).save(buffer, 'JPEG')
+        png = Product.objects.create(name='Beam', price=Decimal('10.00'), main_image=png_upload('beam.png'))
+        jpeg = Product.objects.create(
+            name='Beam JPEG', price=Decimal('10.00'),
+            main_image=SimpleUploadedFile('beam.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        )
+        self.assertNotEqual(
+            images.derivative_name(png.main_image.name, 'card', 'webp'),
+            images.derivative_name(jpeg.main_image.name, 'card', 'webp'),
+        )
+        call_command('run_image_worker', '--once', stdout=StringIO())
+
+        with png.main_image.storage.open(images.derivative_name(png.main_image.name, 'card', 'jpeg')) as f:
+            self.assertEqual(Image.open(f).size, (480, 240))
+        with jpeg.main_image.storage.open(images.derivative_name(jpeg.main_image.name, 'card', 'jpeg')) as f:
+            self.assertEqual(Image.open(f).size, (480, 480))
+
+    def test_missing_original_is_marked_failed(self):
+        product = Product.objects.create(name='Ghost', price=Decimal('10.00'), main_image='products/main_images/gone.png')
+        call_command('run_image_worker', '--once', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Product.objects.get(pk=product.pk).main_image_status, DerivativeStatus.FAILED)
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def applied_pragmas(self):
+        fake = mock.MagicMock(vendor='sqlite')
+        configure_sqlite(sender=None, connection=fake)
+        cursor = fake.cursor.return_value.__enter__.return_value
+        return [call.args[0] for call in cursor.execute.call_args_list]
+
+    def test_wal_is_opt_in(self):
+        self.assertNotIn('PRAGMA journal_mode = WAL', self.applied_pragmas())
+        with override_settings(SQLITE_WAL=True):
+            pragmas = self.applied_pragmas()
+        self.assertIn('PRAGMA journal_mode = WAL', pragmas)
+        self.assertIn('PRAGMA synchronous = NORMAL', pragmas)
+
+    def test_database_url_selects_postgres_with_persistent_connections(self):
+        with mock.patch.dict(os.environ, {'DATABASE_URL': 'postgres://moon:secret@db:5432/moonstar'}):
+            config = database_config('unused.sqlite3')
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(config['NAME'], 'moonstar')
+        self.assertEqual(config['CONN_MAX_AGE'], 600)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+    def test_sqlite_is_the_default(self):
+        with mock.patch.dict(os.environ, clear=True):
+            config = database_config('db.sqlite3')
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+
+class ViewMetricsReportTests(SimpleTestCase):
+    def test_percentile_uses_nearest_rank(self):
+        self.assertEqual(percentile([], 95), 0)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 95), 5)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, pct) for pct in (50, 95, 99)], [50, 95, 99])
+        # 2.5 and 3.5 would round to even; nearest rank always rounds up
+        values = list(range(1, 21))
+        self.assertEqual([percentile(values, pct) for pct in (12.5, 17.5, 95, 99)], [3, 4, 19, 20])
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        # The router only checks that the alias exists; nothing connects to it
+        patcher = mock.patch.dict(settings.DATABASES, {'replica': {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.ReplicaRouter()
+
+    def test_only_manager_reads_in_a_replica_block_use_the_replica(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        with routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+        with routers.primary_reads(), routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def serve(self, request):
+        """Run request through the middleware and return (response, reads seen by the view)"""
+        seen = []
+
+        def get_response(request):
+            match = request.resolver_match = resolve(request.path)
+            middleware.process_view(request, match.func, match.args, match.kwargs)
+            seen.append(routers.current_reads())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        self.assertIsNone(routers.current_reads())
+        return response, seen[0]
+
+    def test_storefront_and_reports_read_from_the_replica(self):
+        factory = RequestFactory()
+        self.assertEqual(self.serve(factory.get(reverse('All_products')))[1], 'replica')
+        self.assertEqual(self.serve(factory.get(reverse('invoice_list')))[1], 'replica')
+        self.assertEqual(self.serve(factory.get(reverse('client_list')))[1], None)
+
+    def test_reads_stick_to_the_primary_after_a_post(self):
+        factory = RequestFactory()
+        response, reads = self.serve(factory.post(reverse('invoice_list')))
+        self.assertEqual(reads, 'default')
+        self.assertEqual(response.cookies['primary_reads']['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        request = factory.get(reverse('All_products'))
+        request.COOKIES['primary_reads'] = '1'
+        self.assertEqual(self.serve(request)[1], 'default')
+
+
+class ReportRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.localdate()
+        cls.client_obj = Client.objects.create(name='Client', address='Cairo', phone='+201000000000')
+        cls.beam = Product.objects.create(
+            name='Beam', category=Product.Category.MOVING_HEAD, price=Decimal('50.00'), main_image='x.png'
+        )
+        cls.smoke = Product.objects.create(
+            name='Hazer', category=Product.Category.SMOKE, price=Decimal('20.00'), main_image='x.png'
+        )
+        # 45 days past due, nothing paid
+        cls.sent = Invoice.objects.create(
+            client=cls.client_obj, date_due=cls.today - timedelta(days=45), status=Invoice.STATUS_SENT
+        )
+        InvoiceItem.objects.create(invoice=cls.sent, product=cls.beam, quantity=2)
+        cls.plan = Invoice.objects.create(
+            client=cls.client_obj, date_due=cls.today + timedelta(days=60), status=Invoice.STATUS_INSTALLMENT
+        )
+        InvoiceItem.objects.create(invoice=cls.plan, product=cls.smoke, quantity=3)
+        Installment.objects.create(invoice=cls.plan, due_date=cls.today + timedelta(days=40), amount=Decimal('60.00'))
+        # Drafts are not revenue
+        draft = Invoice.objects.create(client=cls.client_obj, date_due=cls.today)
+        InvoiceItem.objects.create(invoice=draft, product=cls.beam, quantity=10)
+
+    def test_full_refresh_matches_the_invoices(self):
+        reports.refresh(full=True)
+        month = reports.revenue_by_month(self.today, self.today)
+        self.assertEqual(month[0]['billed_total'], Decimal('160.00'))
+        self.assertEqual(
+            {row['category']: row['revenue_total'] for row in reports.revenue_by_category(self.today, self.today)},
+            {Product.Category.MOVING_HEAD: Decimal('100.00'), Product.Category.SMOKE: Decimal('60.00')},
+        )
+        buckets = {bucket['key']: bucket for bucket in reports.aging()}
+        self.assertEqual(buckets['31_60']['amount'], Decimal('100.00'))
+        self.assertEqual(buckets['not_due']['amount'], Decimal('60.00'))
+        overdue, forecast = reports.installment_forecast()
+        self.assertEqual(overdue['amount_total'], Decimal('0.00'))
+        self.assertEqual(sum(row['amount_total'] for row in forecast), Decimal('60.00'))
+
+    def test_incremental_refresh_picks_up_edits_and_deletes(self):
+        reports.refresh()
+        InvoiceItem.objects.create(invoice=self.sent, product=self.smoke, quantity=1)
+        self.assertEqual(reports.refresh(), 1)
+        self.assertEqual(reports.revenue_by_day(self.today, self.today)[0]['billed_total'], Decimal('180.00'))
+
+        self.plan.delete()
+        reports.refresh()
+        self.assertEqual(reports.revenue_by_day(self.today, self.today)[0]['billed_total'], Decimal('120.00'))
+        self.assertEqual(sum(row['amount_total'] for row in reports.installment_forecast()[1]), Decimal('0.00'))
+
+    def test_reports_page_renders_from_the_rollups(self):
+        reports.refresh()
+        user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        self.client.force_login(user)
+        response = self.client.get(reverse('reports'))
+        self.assertContains(response, 'Hazer')
+        self.assertContains(response, '61–90 days')
+
+
+class ClientLifetimeStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='yousef', password='x', is_staff=True)
+        cls.big = Client.objects.create(name='Big', address='Cairo', phone='+201000000000')
+        cls.small = Client.objects.create(name='Small', address='Giza', phone='+201000000001')
+        cls.new = Client.objects.create(name='New', address='Alexandria', phone='+201000000002')
+        product = Product.objects.create(name='Beam', price=Decimal('50.00'), main_image='x.png')
+        for client_obj, status, quantity in [
+            (cls.big, Invoice.STATUS_SENT, 4),
+            (cls.big, Invoice.STATUS_INSTALLMENT, 2),
+            (cls.big, Invoice.STATUS_DRAFT, 10),
+            (cls.small, Invoice.STATUS_SENT, 1),
+            (cls.small, Invoice.STATUS_CANCELLED, 10),
+        ]:
+            invoice = Invoice.objects.create(client=client_obj, date_due=date(2030, 1, 1), status=status)
+            InvoiceItem.objects.create(invoice=invoice, product=product, quantity=quantity)
+        Invoice.objects.filter(client=cls.big, status=Invoice.STATUS_INSTALLMENT).update(
+            status=Invoice.STATUS_PAID, amount_paid=Decimal('100.00')
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_lifetime_stats_skip_drafts_and_cancelled(self):
+        big = Client.objects.with_lifetime_stats().get(pk=self.big.pk)
+        self.assertEqual(big.lifetime_billed, Decimal('300.00'))
+        self.assertEqual(big.lifetime_paid, Decimal('100.00'))
+        self.assertEqual(big.lifetime_outstanding, Decimal('200.00'))
+        self.assertEqual(big.lifetime_invoices, 2)
+        self.assertIsNotNone(big.last_purchase)
+        new = Client.objects.with_lifetime_stats().get(pk=self.new.pk)
+        self.assertEqual((new.lifetime_billed, new.lifetime_invoices, new.last_purchase), (Decimal('0.00'), 0, None))
+
+    def test_list_sorts_by_lifetime_value(self):
+        response = self.client.get(reverse('client_list'), {'sort': '-lifetime_value'})
+        self.assertEqual([c.name for c in response.context['clients']], ['Big', 'Small', 'New'])
+        response = self.client.get(reverse('client_list'), {'sort': 'bogus'})
+        self.assertEqual(response.context['current_sort'], 'name')
+
+    def test_detail_prefetches_recent_invoices(self):
+        response = self.client.get(reverse('client_detail', kwargs={'pk': self.big.pk}))
+        self.assertEqual(len(response.context['client'].recent_invoices), 3)
+        self.assertContains(response, '$300.00')
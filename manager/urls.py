@@ -1,11 +1,14 @@
 # urls.py
 from django.urls import path
 from .views import (
-    ProductListView,     ProductCreateView,   ProductDetailView, ProductUpdateView,
-    WarehouseListView, WarehouseCreateView, WarehouseDetailView, WarehouseUpdateView,
-    WarehouseProductCreateView,WarehouseProductUpdateView,
+    ProductListView,     ProductCreateView,   ProductDetailView, ProductUpdateView, ProductAutocompleteView,
+    WarehouseListView, WarehouseCreateView, WarehouseDetailView, WarehouseUpdateView, WarehouseSummaryView,
+    WarehouseProductCreateView,WarehouseProductUpdateView, StockImportView,
     ClientListView, ClientCreateView, ClientDetailView, ClientUpdateView,ClientExportView,
-    InvoiceCreateView, InvoiceListView,  InvoiceDetailView ,  InvoiceUpdateView, MarkInvoicePaidView, MarkInstallmentPaidView
+    InvoiceExportView, InvoiceItemExportView, WarehouseStockExportView,
+    ExportJobCreateView, ExportJobStatusView, ExportJobDownloadView,
+    InvoiceCreateView, InvoiceListView,  InvoiceDetailView ,  InvoiceUpdateView, MarkInvoicePaidView, MarkInstallmentPaidView,
+    ReportsView,
 
 )
 from . import views
@@ -15,6 +18,7 @@ urlpatterns = [
     path('products/list/', ProductListView.as_view(), name='product_list'),
     path('products/create/', ProductCreateView.as_view(), name='product_create'),
     path('products/add-image-field/', views.add_image_field, name='add_image_field'),
+    path('products/autocomplete/', ProductAutocompleteView.as_view(), name='product_autocomplete'),
     path('products/<int:pk>/', ProductDetailView.as_view(), name='product_detail'),
     path('products/<int:pk>/edit/', ProductUpdateView.as_view(), name='product_update'),
     
@@ -23,10 +27,14 @@ urlpatterns = [
     path('warehouses/create/', WarehouseCreateView.as_view(), name='warehouse_create'),
     path('warehouses/<int:pk>/', WarehouseDetailView.as_view(), name='warehouse_detail'),
     path('warehouses/<int:pk>/edit/', WarehouseUpdateView.as_view(), name='warehouse_update'),
+    path('warehouses/summary/', WarehouseSummaryView.as_view(), name='warehouse_summary'),
+    path('warehouses/<int:pk>/summary/', WarehouseSummaryView.as_view(), name='warehouse_detail_summary'),
+    path('warehouses/export/', WarehouseStockExportView.as_view(), name='warehouse_stock_export'),
 
     # WarehouseProduct URLs
     path('warehouses/<int:warehouse_id>/add-product/', WarehouseProductCreateView.as_view(), name='warehouseproduct_create'),
     path('warehouse-product/<int:pk>/edit/', WarehouseProductUpdateView.as_view(), name='warehouseproduct_update'),
+    path('warehouse-product/import/', StockImportView.as_view(), name='stock_import'),
 
     
     # Clients URLs    
@@ -42,6 +50,16 @@ urlpatterns = [
     path('invoices/create/', InvoiceCreateView.as_view(), name='invoice_create'),   
     path('invoices/<int:pk>/', InvoiceDetailView.as_view(), name='invoice_detail'), 
     path('invoices/<int:pk>/edit/', InvoiceUpdateView.as_view(), name='invoice_update'),
+    path('invoices/export/', InvoiceExportView.as_view(), name='invoice_export'),
+    path('invoices/export/items/', InvoiceItemExportView.as_view(), name='invoice_item_export'),
     path('invoice/<int:pk>/mark-paid/', MarkInvoicePaidView.as_view(), name='mark_invoice_paid'),
     path('invoices/installment/<int:pk>/mark-paid/', MarkInstallmentPaidView.as_view(), name='mark_installment_paid'),
+
+    # Reports
+    path('reports/', ReportsView.as_view(), name='reports'),
+
+    # Background export URLs
+    path('exports/<str:export_name>/queue/', ExportJobCreateView.as_view(), name='export_job_create'),
+    path('exports/jobs/<int:pk>/', ExportJobStatusView.as_view(), name='export_job_status'),
+    path('exports/jobs/<int:pk>/download/', ExportJobDownloadView.as_view(), name='export_job_download'),
 ]
\ No newline at end of file
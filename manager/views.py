@@ -1,6 +1,6 @@
 # views.py
 from django.shortcuts import render, redirect
-from .models import Product, Warehouse, ProductImage, WarehouseProduct, Client,Invoice, InvoiceItem  ,Installment
+from .models import Product, Warehouse, ProductImage, WarehouseProduct, Client,Invoice, InvoiceItem  ,Installment, ExportJob
 from .forms import ProductForm, WarehouseForm, ProductImageFormSet ,WarehouseProductFormUpdate,WarehouseProductFormAdd ,ClientForm ,InstallmentFormSet
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
@@ -12,6 +12,7 @@ from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django_filters.views import FilterView
 from .filters import ProductFilter
+from .autocomplete import product_index
 
 
 
@@ -31,6 +32,9 @@ class ProductListView(LoginRequiredMixin, FilterView):
     filterset_class = ProductFilter
     paginate_by = 20
 
+    def get_queryset(self):
+        return Product.objects.with_stock_totals().order_by('name', 'pk')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = context['filter']  # Make filter available in template
@@ -70,6 +74,23 @@ def add_image_field(request):
         'prefix': form.prefix
     })
 
+class ProductAutocompleteView(LoginRequiredMixin, View):
+    """Typeahead matches for the invoice item product pickers"""
+    max_results = 20
+    default_results = 10
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.GET.get('limit', self.default_results))
+        except (TypeError, ValueError):
+            limit = self.default_results
+        return max(1, min(limit, self.max_results))
+
+    def get(self, request):
+        limit = self.get_limit()
+        results = product_index.search(request.GET.get('q', ''), limit=limit)
+        return JsonResponse({'status': 'success', 'results': results})
+
 class ProductDetailView(LoginRequiredMixin, DetailView):
     model = Product
     template_name = 'manager/products/detail.html'
@@ -116,6 +137,9 @@ class WarehouseListView(LoginRequiredMixin, ListView):
     template_name = 'manager/warehouses/list.html'  
     context_object_name = 'warehouses'
 
+    def get_queryset(self):
+        return Warehouse.objects.with_inventory_summary().order_by('name')
+
 class WarehouseCreateView(LoginRequiredMixin, CreateView):
     model = Warehouse
     form_class = WarehouseForm
@@ -129,12 +153,18 @@ class WarehouseDetailView(LoginRequiredMixin, DetailView):
     template_name = 'manager/warehouses/detail.html'
     context_object_name = 'warehouse'
 
+    def get_queryset(self):
+        return Warehouse.objects.with_inventory_summary()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         inventory = self.object.warehouse_products.select_related('product')
         for item in inventory:
             item.edit_url = reverse('warehouseproduct_update', kwargs={'pk': item.pk})
         context['inventory'] = inventory
+        context['recent_movements'] = self.object.stock_movements.select_related(
+            'product', 'created_by'
+        )[:20]
         return context
 
 
@@ -144,10 +174,26 @@ class WarehouseUpdateView(LoginRequiredMixin, UpdateView):
     form_class = WarehouseForm
     template_name = 'manager/warehouses/update.html'
     success_url = reverse_lazy('warehouse_list')
+
+
+class WarehouseSummaryView(LoginRequiredMixin, View):
+    """JSON inventory summary for one warehouse (pk given) or for all of them"""
+    def get(self, request, pk=None):
+        warehouses = Warehouse.objects.all()
+        if pk is not None:
+            warehouses = warehouses.filter(pk=pk)
+        totals, rows = warehouses.inventory_summary()
+        if pk is not None:
+            if not rows:
+                return JsonResponse({'status': 'error', 'message': 'Warehouse not found'}, status=404)
+            return JsonResponse({'status': 'success', 'warehouse': rows[0]})
+        return JsonResponse({'status': 'success', 'totals': totals, 'warehouses': rows})
     
     
 from django.contrib import messages
-from django.views.generic import CreateView
+from django.views.generic import CreateView, FormView
+from .forms import StockImportForm
+from .imports import StockImport, StockImportError
 
 class WarehouseProductCreateView(LoginRequiredMixin, CreateView):
     model = WarehouseProduct
@@ -174,25 +220,14 @@ class WarehouseProductCreateView(LoginRequiredMixin, CreateView):
         product = form.cleaned_data['product']
         quantity = form.cleaned_data['quantity']
         
-        # Check if product already exists in warehouse
-        try:
-            existing_item = WarehouseProduct.objects.get(
-                warehouse=warehouse,
-                product=product
-            )
-            # Update existing quantity
-            existing_item.quantity += quantity
-            existing_item.save()
-            messages.success(self.request, 
-                f"Updated {product.name} quantity in inventory (Added {quantity} units)")
-            self.object = existing_item
-        except WarehouseProduct.DoesNotExist:
-            form.instance.warehouse = warehouse
-            response = super().form_valid(form)
+        # Single atomic increment (or insert), recorded in the stock ledger
+        created = WarehouseProduct.receive(warehouse, product, quantity, user=self.request.user)
+        if created:
             messages.success(self.request, 
                 f"Added {product.name} to inventory ({quantity} units)")
-            return response
-            
+        else:
+            messages.success(self.request, 
+                f"Updated {product.name} quantity in inventory (Added {quantity} units)")
         return redirect(self.get_success_url())
 
     def get_success_url(self):
@@ -201,37 +236,116 @@ class WarehouseProductCreateView(LoginRequiredMixin, CreateView):
     
     
 
+class StockImportView(LoginRequiredMixin, FormView):
+    form_class = StockImportForm
+    template_name = 'manager/warehouseproduct/import.html'
+    success_url = reverse_lazy('warehouse_list')
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        try:
+            stock_import = StockImport.from_file(upload, upload.name, default_mode=form.cleaned_data['mode'])
+        except StockImportError as exc:
+            form.add_error('file', str(exc))
+            return self.form_invalid(form)
+
+        dry_run = form.cleaned_data['dry_run']
+        if not stock_import.run(dry_run=dry_run, user=self.request.user):
+            return self.render_to_response(self.get_context_data(form=form, import_errors=stock_import.errors))
+
+        if dry_run:
+            messages.info(self.request, f"Sheet is valid: {stock_import.summary} (nothing saved)")
+            return self.render_to_response(self.get_context_data(form=form))
+        messages.success(self.request, f"Stock imported: {stock_import.summary}")
+        return super().form_valid(form)
+
+
+
 ################## Clients ##################    
 from django.views import View
-from django.http import HttpResponse
-import csv
+from django.http import FileResponse, Http404
+from .exports import EXPORTS, ClientExport, InvoiceExport, InvoiceItemExport, WarehouseStockExport
+
+
+class ExportView(LoginRequiredMixin, View):
+    """Streams a CSV export; query parameters are passed on as export filters"""
+    export_class = None
 
-class ClientExportView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="clients_export.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow([
-            'Name', 
-            'Address', 
-            'Phone', 
-            'Email', 
-            'Created At',
-            'Updated At'
-        ])
-        
-        for client in Client.objects.all().order_by('name'):
-            writer.writerow([
-                client.name,
-                client.address,
-                client.phone,
-                client.email or '',
-                client.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-                client.updated_at.strftime("%Y-%m-%d %H:%M:%S")
-            ])
-        
-        return response
+        return self.export_class(request.GET).streaming_response()
+
+
+class ClientExportView(ExportView):
+    export_class = ClientExport
+
+
+class InvoiceExportView(ExportView):
+    export_class = InvoiceExport
+
+
+class InvoiceItemExportView(ExportView):
+    export_class = InvoiceItemExport
+
+
+class WarehouseStockExportView(ExportView):
+    export_class = WarehouseStockExport
+
+
+class ExportJobCreateView(LoginRequiredMixin, View):
+    """Queue a background export (or reuse a recent identical one) and report its status"""
+    def post(self, request, export_name):
+        if export_name not in EXPORTS:
+            return JsonResponse({'status': 'error', 'message': 'Unknown export'}, status=404)
+        params = {**request.GET.dict(), **request.POST.dict()}
+        job, reused = ExportJob.request(export_name, params, request.user)
+        return JsonResponse({'status': 'success', 'reused': reused, 'job': export_job_payload(job)})
+
+
+class ExportJobStatusView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk)
+        return JsonResponse({'status': 'success', 'job': export_job_payload(job)})
+
+
+class ExportJobDownloadView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, status=ExportJob.STATUS_DONE)
+        if not job.file or not job.file.storage.exists(job.file.name):
+            raise Http404("Export file is no longer available")
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=job.get_export().filename,
+            content_type='text/csv'
+        )
+
+
+def export_job_payload(job):
+    return {
+        'id': job.pk,
+        'export': job.export_name,
+        'params': job.params,
+        'state': job.status,
+        'rows': job.row_count,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'status_url': reverse('export_job_status', kwargs={'pk': job.pk}),
+        'download_url': (
+            reverse('export_job_download', kwargs={'pk': job.pk})
+            if job.status == ExportJob.STATUS_DONE else None
+        ),
+    }
+
+from django.db.models import Prefetch
+
+CLIENT_SORTS = {
+    'name': ['name', 'pk'],
+    'lifetime_value': ['lifetime_billed', 'name', 'pk'],
+    '-lifetime_value': ['-lifetime_billed', 'name', 'pk'],
+}
+RECENT_INVOICES_LIMIT = 5
+
 
 class ClientListView(LoginRequiredMixin, ListView):
     model = Client
@@ -239,6 +353,18 @@ class ClientListView(LoginRequiredMixin, ListView):
     context_object_name = 'clients'
     paginate_by = 20
 
+    def get_sort(self):
+        sort = self.request.GET.get('sort', '')
+        return sort if sort in CLIENT_SORTS else 'name'
+
+    def get_queryset(self):
+        return Client.objects.with_lifetime_stats().order_by(*CLIENT_SORTS[self.get_sort()])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['current_sort'] = self.get_sort()
+        return context
+
 class ClientCreateView(LoginRequiredMixin, CreateView):
     model = Client
     form_class = ClientForm
@@ -254,6 +380,12 @@ class ClientUpdateView(LoginRequiredMixin, UpdateView):
 class ClientDetailView(LoginRequiredMixin, DetailView):
     model = Client
     template_name = 'manager/clients/detail.html'
+
+    def get_queryset(self):
+        recent = Invoice.objects.order_by('-date_created', '-pk')[:RECENT_INVOICES_LIMIT]
+        return Client.objects.with_lifetime_stats().prefetch_related(
+            Prefetch('invoices', queryset=recent, to_attr='recent_invoices')
+        )
     
     
     
@@ -573,7 +705,7 @@ class InvoiceUpdateView(LoginRequiredMixin, UpdateView):
 
 
 from django.views.generic import ListView
-from django.db.models import Sum, F, ExpressionWrapper, DecimalField
+from django.db.models import Sum, F, ExpressionWrapper, DecimalField, Prefetch
 from django.utils import timezone
 from decimal import Decimal
 
@@ -614,24 +746,15 @@ class InvoiceListView(LoginRequiredMixin, ListView):
         context['date_from'] = self.request.GET.get('date_from', '')
         context['date_to'] = self.request.GET.get('date_to', '')
         
-        # Calculate summary statistics
-        total_amount = Decimal('0')
-        paid_amount = Decimal('0')
-        overdue_count = 0
-        
-        for invoice in context['invoices']:
-            invoice_total = invoice.total  # Using the property
-            total_amount += invoice_total
-            
-            if invoice.status == 'paid':
-                paid_amount += invoice_total
-                
-            if invoice.status != 'paid' and invoice.date_due < today:
-                overdue_count += 1
-        
-        context['total_amount'] = total_amount
-        context['paid_amount'] = paid_amount
-        context['overdue_count'] = overdue_count
+        # Summary statistics over the whole filtered set, not just this page
+        summary, status_breakdown = self.object_list.summary_by_status(today)
+        context['summary'] = summary
+        context['status_breakdown'] = status_breakdown
+        context['total_amount'] = summary['billed']
+        context['paid_amount'] = summary['paid']
+        context['outstanding_amount'] = summary['outstanding']
+        context['overdue_count'] = summary['overdue_count']
+        context['overdue_amount'] = summary['overdue_amount']
         
         return context
     
@@ -642,6 +765,14 @@ class InvoiceDetailView(LoginRequiredMixin, DetailView):
     template_name = 'manager/invoices/detail.html'
     context_object_name = 'invoice'
 
+    def get_queryset(self):
+        # Everything the invoice page renders, in a fixed number of queries
+        # regardless of how many items or installments the invoice has
+        return Invoice.objects.select_related('client', 'assigned_to').prefetch_related(
+            Prefetch('items', queryset=InvoiceItem.objects.select_related('product')),
+            'installments',
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['today'] = timezone.now().date()
@@ -687,7 +818,7 @@ class InvoiceUpdateView(LoginRequiredMixin, UpdateView):
     
     
     
-class WarehouseProductUpdateView(UpdateView):
+class WarehouseProductUpdateView(LoginRequiredMixin, UpdateView):
     model = WarehouseProduct
     form_class = WarehouseProductFormUpdate
     template_name = 'manager/warehouseproduct/update.html'
@@ -695,32 +826,72 @@ class WarehouseProductUpdateView(UpdateView):
     def get_success_url(self):
         return reverse('warehouse_detail', kwargs={'pk': self.object.warehouse.pk})
 
+    def get_queryset(self):
+        return WarehouseProduct.objects.select_related('product', 'warehouse')
+
     def form_valid(self, form):
+        self.object.set_quantity(form.cleaned_data['quantity'], user=self.request.user)
         messages.success(
             self.request,
             f"Updated quantity for {self.object.product.name} in {self.object.warehouse.name} to {form.cleaned_data['quantity']}"
         )
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
     
     
     
     
 class MarkInstallmentPaidView(LoginRequiredMixin, View):
     def post(self, request, pk):
-        installment = get_object_or_404(Installment, pk=pk)
-        
-        if not installment.is_paid:
-            installment.is_paid = True
-            installment.payment_date = timezone.now().date()
-            installment.save()
-            
-            # Update invoice amount paid
-            invoice = installment.invoice
-            invoice.amount_paid += installment.amount
-            if invoice.amount_paid >= invoice.total:
-                invoice.status = 'paid'
-            invoice.save()
-            
-            return JsonResponse({'status': 'success'})
+        try:
+            installment = Installment.pay(pk)
+        except Installment.DoesNotExist:
+            raise Http404("No installment found")
+
+        if installment is not None:
+            return JsonResponse({
+                'status': 'success',
+                'invoice_status': installment.invoice.status,
+                'amount_paid': str(installment.invoice.amount_paid),
+                'balance_due': str(installment.invoice.balance_due),
+            })
         
-        return JsonResponse({'status': 'error', 'message': 'Installment already paid'})
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': 'Installment already paid'})
+
+
+from datetime import date, timedelta
+from django.utils.dateparse import parse_date
+from django.views.generic import TemplateView
+from . import reports
+
+
+class ReportsView(LoginRequiredMixin, TemplateView):
+    """Revenue, receivables aging and installment forecast, read from the report rollups"""
+    template_name = 'manager/reports/dashboard.html'
+    DAILY_DAYS = 31
+
+    def get_range(self):
+        end = parse_date(self.request.GET.get('end') or '') or timezone.localdate()
+        # Default to the twelve calendar months ending with end's month
+        year, month = divmod(end.year * 12 + end.month - 12, 12)
+        start = parse_date(self.request.GET.get('start') or '') or date(year, month + 1, 1)
+        return min(start, end), end
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        start, end = self.get_range()
+        overdue, forecast = reports.installment_forecast()
+        context.update({
+            'start': start,
+            'end': end,
+            'daily_days': self.DAILY_DAYS,
+            'refreshed_through': reports.refreshed_through(),
+            'by_month': reports.revenue_by_month(start, end),
+            'by_day': reports.revenue_by_day(max(start, end - timedelta(days=self.DAILY_DAYS - 1)), end),
+            'by_client': reports.revenue_by_client(start, end),
+            'by_product': reports.revenue_by_product(start, end),
+            'by_category': reports.revenue_by_category(start, end),
+            'aging': reports.aging(),
+            'overdue_installments': overdue,
+            'installment_forecast': forecast,
+        })
+        return context
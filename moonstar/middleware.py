@@ -0,0 +1,243 @@
+"""
+Per-view performance instrumentation, and read-replica selection per request.
+
+ViewMetricsMiddleware records, for every request, the SQL query count, SQL
+time, template render time and total latency under the URL name that served
+it. Samples are buffered in process and flushed in batches to a small
+SQLite file (settings.VIEW_METRICS_PATH), which the view_metrics_report
+management command summarises. It is off unless the VIEW_METRICS_ENABLED
+environment variable is 1.
+
+Template render time covers TemplateResponse rendering (the class-based
+views); function views that call render() report it as part of the view.
+"""
+import atexit
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import routers
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    recorded_at REAL NOT NULL,
+    view TEXT NOT NULL,
+    method TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    sql_ms REAL NOT NULL,
+    template_ms REAL NOT NULL,
+    queries INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_view_time ON samples (view, recorded_at);
+"""
+
+
+class MetricsStore:
+    """Buffers samples in memory and appends them to the metrics file in batches"""
+
+    def __init__(self, path, flush_interval=30, max_buffer=500, retention_days=7):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retention_days = retention_days
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=5)
+        db.executescript(SCHEMA)
+        return db
+
+    def record(self, sample):
+        with self.lock:
+            self.buffer.append(sample)
+            due = (
+                len(self.buffer) >= self.max_buffer
+                or time.monotonic() - self.last_flush >= self.flush_interval
+            )
+            if not due:
+                return
+            batch, self.buffer = self.buffer, []
+            self.last_flush = time.monotonic()
+        self.write(batch)
+
+    def flush(self):
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+            self.last_flush = time.monotonic()
+        self.write(batch)
+
+    def write(self, batch):
+        if not batch:
+            return
+        try:
+            db = self.connect()
+            try:
+                with db:
+                    db.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                    db.execute(
+                        "DELETE FROM samples WHERE recorded_at < ?",
+                        (time.time() - self.retention_days * 86400,)
+                    )
+            finally:
+                db.close()
+        except sqlite3.Error:
+            # Metrics must never break a request; drop the batch instead
+            pass
+
+    def load(self, since=None):
+        """Return {view: [(latency_ms, sql_ms, template_ms, queries), ...]}"""
+        self.flush()
+        if not os.path.exists(self.path):
+            return {}
+        db = self.connect()
+        try:
+            rows = db.execute(
+                "SELECT view, latency_ms, sql_ms, template_ms, queries FROM samples WHERE recorded_at >= ?",
+                (since or 0,)
+            )
+            samples = {}
+            for view, *values in rows:
+                samples.setdefault(view, []).append(tuple(values))
+            return samples
+        finally:
+            db.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetricsStore(
+                settings.VIEW_METRICS_PATH,
+                flush_interval=settings.VIEW_METRICS_FLUSH_INTERVAL,
+                retention_days=settings.VIEW_METRICS_RETENTION_DAYS,
+            )
+            atexit.register(_store.flush)
+        return _store
+
+
+class QueryTimer:
+    """Database execute wrapper that counts queries and accumulates their time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+
+
+class ViewMetricsMiddleware:
+    """Records query count, SQL time, template time and latency per URL name"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.VIEW_METRICS_ENABLED
+        self.sample_rate = settings.VIEW_METRICS_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.enabled or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        request._view_metrics_template_seconds = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        latency = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        get_store().record((
+            time.time(),
+            view,
+            request.method,
+            response.status_code,
+            latency * 1000,
+            timer.seconds * 1000,
+            request._view_metrics_template_seconds * 1000,
+            timer.count,
+        ))
+        return response
+
+    def process_template_response(self, request, response):
+        # This middleware is listed first, so its hook runs after every other
+        # process_template_response and rendering here is the final render
+        if hasattr(request, '_view_metrics_template_seconds'):
+            start = time.perf_counter()
+            response.render()
+            request._view_metrics_template_seconds += time.perf_counter() - start
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Serves replica-eligible views (settings.REPLICA_VIEW_MODULES and
+    REPLICA_VIEW_NAMES) from the replica, and pins a client to the primary
+    for REPLICA_STICKY_SECONDS after an unsafe request. Unused when no
+    replica is configured.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not routers.replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cookie = settings.REPLICA_STICKY_COOKIE
+        self.view_modules = set(settings.REPLICA_VIEW_MODULES)
+        self.view_names = set(settings.REPLICA_VIEW_NAMES)
+
+    def __call__(self, request):
+        unsafe = request.method not in self.SAFE_METHODS
+        request.replica_pinned = unsafe or self.cookie in request.COOKIES
+        with routers.reads_from(routers.PRIMARY if request.replica_pinned else None):
+            response = self.get_response(request)
+            reads = routers.current_reads()
+
+        if response.streaming and reads:
+            # Streamed exports run their queries after this returns
+            response.streaming_content = self.read_from(reads, response.streaming_content)
+        if unsafe:
+            response.set_cookie(
+                self.cookie, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if view_func.__module__ in self.view_modules or request.resolver_match.url_name in self.view_names:
+            # Lasts until the reads_from() block in __call__ ends
+            routers.switch_to_replica()
+        return None
+
+    @staticmethod
+    def read_from(reads, content):
+        content = iter(content)
+        while True:
+            with routers.reads_from(reads):
+                try:
+                    chunk = next(content)
+                except StopIteration:
+                    return
+            yield chunk
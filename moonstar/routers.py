@@ -0,0 +1,86 @@
+"""
+Read-replica routing.
+
+When a 'replica' database is configured (see moonstar/database.py), reads
+made inside replica_reads() go to it and everything else uses the primary.
+ReplicaRoutingMiddleware opens that block for the storefront and the
+manager's reporting views (settings.REPLICA_VIEW_MODULES and
+REPLICA_VIEW_NAMES), and ExportJob.run() opens it for background exports.
+
+Writes always go to the primary. After a POST (or any other unsafe method)
+the client's reads stay on the primary for REPLICA_STICKY_SECONDS, so
+someone who just saved an invoice sees it even if the replica lags.
+
+Only models from REPLICA_APPS are read from the replica; sessions, users
+and the like always come from the primary. Storefront pages are cached, so
+for REPLICA_STICKY_SECONDS after a catalog change they are rendered from
+the primary (see sales/cache.py); keep the replica lag below that.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+REPLICA_APPS = {'manager'}
+
+# REPLICA inside replica_reads(), PRIMARY inside primary_reads(), else None
+_reads = ContextVar('database_reads', default=None)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def current_reads():
+    return _reads.get()
+
+
+@contextmanager
+def reads_from(alias):
+    """Route reads in this block to alias (PRIMARY, REPLICA or None for the default)"""
+    token = _reads.set(alias)
+    try:
+        yield
+    finally:
+        _reads.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """Send reads in this block to the replica, unless the primary is pinned"""
+    with reads_from(PRIMARY if _reads.get() == PRIMARY else REPLICA):
+        yield
+
+
+def primary_reads():
+    """Keep reads in this block on the primary, including nested replica_reads()"""
+    return reads_from(PRIMARY)
+
+
+def switch_to_replica():
+    """Route the rest of the enclosing reads_from() block to the replica, unless pinned"""
+    if _reads.get() != PRIMARY:
+        _reads.set(REPLICA)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            _reads.get() == REPLICA
+            and model._meta.app_label in REPLICA_APPS
+            and replica_configured()
+        ):
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
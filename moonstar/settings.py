@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from .database import database_config, replica_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Listed first so it times the whole stack and renders TemplateResponses last
+    'moonstar.middleware.ViewMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'moonstar.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'moonstar.urls'
@@ -77,12 +82,30 @@ WSGI_APPLICATION = 'moonstar.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite (tuned for concurrent workers) unless DATABASE_URL points elsewhere;
+# see moonstar/database.py. SQLITE_WAL=1 switches a deployed SQLite file to
+# WAL; it is off so development commands leave the committed db.sqlite3 alone
+SQLITE_WAL = os.environ.get('SQLITE_WAL', '0') == '1'
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR / 'db.sqlite3'),
 }
+if replica := replica_config(DATABASES['default']):
+    DATABASES['replica'] = replica
+
+# Storefront and report reads go to the replica when there is one; see moonstar/routers.py
+DATABASE_ROUTERS = ['moonstar.routers.ReplicaRouter']
+REPLICA_VIEW_MODULES = ['sales.views']
+REPLICA_VIEW_NAMES = [
+    'invoice_list',
+    'reports',
+    'client_export',
+    'invoice_export',
+    'invoice_item_export',
+    'warehouse_stock_export',
+]
+# After a POST a client reads from the primary for this long, covering replica lag
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+REPLICA_STICKY_COOKIE = 'primary_reads'
 
 
 # Password validation
@@ -126,6 +149,48 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'moonstar/static')]
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Files that are only served through login-protected views (finished
+# exports); keep this outside MEDIA_ROOT and out of the web server's reach
+PRIVATE_MEDIA_ROOT = os.environ.get('PRIVATE_MEDIA_ROOT', os.path.join(BASE_DIR, 'private_media'))
+
+# Background exports: identical export requests within this many seconds
+# reuse the file already written to PRIVATE_MEDIA_ROOT/exports/
+EXPORT_CACHE_TTL = int(os.environ.get('EXPORT_CACHE_TTL', 60 * 60))
+
+# Per-view query/latency metrics (see moonstar/middleware.py); report them
+# with `python manage.py view_metrics_report`. Off unless VIEW_METRICS_ENABLED=1,
+# so tests and management commands do not write the metrics file
+VIEW_METRICS_ENABLED = os.environ.get('VIEW_METRICS_ENABLED', '0') == '1'
+VIEW_METRICS_PATH = os.environ.get('VIEW_METRICS_PATH', os.path.join(BASE_DIR, 'view_metrics.sqlite3'))
+VIEW_METRICS_SAMPLE_RATE = float(os.environ.get('VIEW_METRICS_SAMPLE_RATE', 1.0))
+VIEW_METRICS_FLUSH_INTERVAL = 30  # seconds
+VIEW_METRICS_RETENTION_DAYS = 7
+
+# Caches. The storefront page cache lives in its own alias; point
+# SALES_CACHE_DIR at a shared directory to use the file backend when more
+# than one process serves the site (see sales/cache.py)
+SALES_CACHE_DIR = os.environ.get('SALES_CACHE_DIR')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sales': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SALES_CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    } if SALES_CACHE_DIR else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sales',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+SALES_CACHE_ALIAS = 'sales'
+SALES_PAGE_CACHE_TIMEOUT = int(os.environ.get('SALES_PAGE_CACHE_TIMEOUT', 60 * 60))
+
+# The product typeahead index is rebuilt on Product signals, and at least this
+# often (seconds) so other worker processes pick up changes too
+PRODUCT_AUTOCOMPLETE_MAX_AGE = 300
+
 
 # Authentication settings
 LOGIN_URL = '/accounts/login/'
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class SalesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'sales'
+
+    def ready(self):
+        from manager.images import derivatives_ready
+        from manager.models import Product, ProductImage
+        from .cache import product_changed, product_image_changed
+
+        for signal in (post_save, post_delete, derivatives_ready):
+            signal.connect(product_changed, sender=Product, dispatch_uid=f'sales_cache_product_{signal}')
+            signal.connect(product_image_changed, sender=ProductImage, dispatch_uid=f'sales_cache_image_{signal}')
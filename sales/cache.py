@@ -0,0 +1,193 @@
+# sales/cache.py
+"""
+Page cache for the public storefront.
+
+A rendered page is stored under a key built from its path, the query
+parameters the view declares (category, page, sort, search and price for
+the catalog) and the current version of every catalog scope it shows.
+Other parameters do not change what is rendered, so they are left out of
+the key, and pages rendered for such requests are not stored. Junk
+parameters therefore cannot fill the cache. Scopes are 'all' (any
+product), 'category:<value>' and 'product:<pk>'. Product and ProductImage
+signals bump only the scopes a change touches, so e.g. editing a smoke
+machine leaves the laser pages cached. Old entries are never deleted;
+they just stop being looked up and expire after SALES_PAGE_CACHE_TIMEOUT.
+
+Versions are random tokens rather than counters. The cache may evict a
+version key like any other entry, and a missing version simply starts a
+new one, so an old page can never match again.
+
+Use a file-based backend for the 'sales' cache when several processes
+serve the site, so a bump in one process is seen by all of them.
+
+Storefront reads normally go to the read replica (moonstar/routers.py).
+A page rendered from a replica that has not caught up with a bump would be
+cached under the new version for the whole timeout, so for
+REPLICA_STICKY_SECONDS after a bump, cache misses on the bumped scopes
+are rendered from the primary.
+"""
+import hashlib
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from moonstar.routers import primary_reads, replica_configured
+
+ALL = 'all'
+
+
+def get_cache():
+    return caches[settings.SALES_CACHE_ALIAS]
+
+
+def category_scope(category):
+    # Category values contain spaces, which are not valid in cache keys
+    return 'category:' + category.replace(' ', '_')
+
+
+def product_scope(pk):
+    return f'product:{pk}'
+
+
+def _version_key(scope):
+    return f'sales:version:{scope}'
+
+
+def _bumped_key(scope):
+    return f'sales:bumped:{scope}'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _versions(scopes):
+    """{scope: current version token}, starting a new version for scopes that have none"""
+    cache = get_cache()
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(list(keys.values()))
+    versions = {}
+    for scope, key in keys.items():
+        if key not in found:
+            # Never bumped, or evicted: a fresh token, so no page cached earlier matches
+            token = _new_version()
+            cache.add(key, token, timeout=None)
+            found[key] = cache.get(key) or token
+        versions[scope] = found[key]
+    return versions
+
+
+def bump(*scopes):
+    """Invalidate every cached page that shows one of these scopes"""
+    cache = get_cache()
+    cache.set_many({_version_key(scope): _new_version() for scope in scopes}, timeout=None)
+    # Remembered for as long as the replica may lag behind this change
+    cache.set_many({_bumped_key(scope): 1 for scope in scopes}, settings.REPLICA_STICKY_SECONDS)
+
+
+def _fresh(scopes, compute):
+    """compute(), reading from the primary if one of scopes was bumped within the replica lag"""
+    if replica_configured() and get_cache().get_many([_bumped_key(scope) for scope in scopes]):
+        with primary_reads():
+            return compute()
+    return compute()
+
+
+def page_key(request, scopes, params=()):
+    versions = _versions(scopes)
+    query = urlencode(sorted(
+        (name, value) for name in set(params) for value in request.GET.getlist(name)
+    ))
+    parts = [request.path, query] + [f'{scope}={versions[scope]}' for scope in sorted(scopes)]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'sales:page:{digest}'
+
+
+def cached_value(name, scopes, compute):
+    """compute() once per version of the given scopes"""
+    cache = get_cache()
+    versions = _versions(scopes)
+    key = 'sales:value:' + '|'.join(
+        [name] + [f'{scope}={versions[scope]}' for scope in sorted(scopes)]
+    )
+    value = cache.get(key)
+    if value is None:
+        value = _fresh(scopes, compute)
+        cache.set(key, value, settings.SALES_PAGE_CACHE_TIMEOUT)
+    return value
+
+
+def cached_page(request, scopes, render, params=()):
+    """
+    Return the cached response for this request, or render(), store and
+    return it. params names the query parameters that change the page.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return render()
+    cache = get_cache()
+    key = page_key(request, scopes, params)
+    cached = cache.get(key)
+    if cached is not None:
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    def render_now():
+        # Template responses run their queries while rendering
+        response = render()
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        return response
+
+    response = _fresh(scopes, render_now)
+    # A page rendered with unknown parameters may echo them (e.g. in pagination links)
+    storable = set(request.GET) <= set(params)
+    if storable and response.status_code == 200 and not response.cookies and not response.streaming:
+        cache.set(key, (response.content, response['Content-Type']), settings.SALES_PAGE_CACHE_TIMEOUT)
+    return response
+
+
+def cache_catalog_page(scopes=lambda request, **kwargs: [ALL]):
+    """Decorator for function views; scopes(request, **kwargs) lists what the page shows"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return cached_page(
+                request, scopes(request, **kwargs), lambda: view(request, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
+
+
+class CatalogCacheMixin:
+    """Page caching for class-based storefront views"""
+    # Query parameters that change the rendered page
+    cache_params = ()
+
+    def get_cache_scopes(self):
+        return [ALL]
+
+    def dispatch(self, request, *args, **kwargs):
+        return cached_page(
+            request, self.get_cache_scopes(),
+            lambda: super(CatalogCacheMixin, self).dispatch(request, *args, **kwargs),
+            self.cache_params,
+        )
+
+
+# Signal handlers (connected in SalesConfig.ready)
+
+def product_changed(sender, instance, **kwargs):
+    scopes = [ALL, category_scope(instance.category), product_scope(instance.pk)]
+    original = getattr(instance, '_original_category', None)
+    if original and original != instance.category:
+        scopes.append(category_scope(original))
+    bump(*scopes)
+
+
+def product_image_changed(sender, instance, **kwargs):
+    # Only the product's own page shows its gallery
+    bump(product_scope(instance.product_id))
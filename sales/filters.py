@@ -1,10 +1,10 @@
 # sales/filters.py
 import django_filters
 from django import forms
-from django.db.models import Q
 from manager.models import Product
+from manager.search import SearchFilterMixin
 
-class ProductFilter(django_filters.FilterSet):
+class ProductFilter(SearchFilterMixin, django_filters.FilterSet):
     search = django_filters.CharFilter(
         method='filter_search',
         label='',
@@ -27,14 +27,14 @@ class ProductFilter(django_filters.FilterSet):
         choices=Product.Category.choices,
         label='Category',
         empty_label='All Categories',
-        widget=forms.Select(attrs={'class': 'form-select'})
+        widget=forms.Select  # Note: Passing the class, not an instance
     )
     
     sort = django_filters.OrderingFilter(
         fields=(
-            ('name', 'Name'),
-            ('price', 'Price'),
-            ('created_at', 'Newest'),
+            ('name', 'name'),
+            ('price', 'price'),
+            ('created_at', 'created_at'),
         ),
         field_labels={
             'name': 'Name (A-Z)',
@@ -45,15 +45,9 @@ class ProductFilter(django_filters.FilterSet):
             '-created_at': 'Newest First',
         },
         label='Sort By',
-        widget=forms.Select(attrs={'class': 'form-select'})
+        widget=forms.Select  # Note: Passing the class, not an instance
     )
 
-    def filter_search(self, queryset, name, value):
-        return queryset.filter(
-            Q(name__icontains=value) | 
-            Q(details__icontains=value)
-        )
-
     class Meta:
         model = Product
         fields = []
\ No newline at end of file
@@ -1,3 +1,159 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from manager.models import Product, ProductImage
+from moonstar import routers
+
+from . import cache
+
+
+class CatalogPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        image = 'products/main_images/test.png'
+        cls.laser = Product.objects.create(
+            name='Laser One', category=Product.Category.LASER_BEAM, price=Decimal('100.00'), main_image=image
+        )
+        cls.smoke = Product.objects.create(
+            name='Smoke One', category=Product.Category.SMOKE, price=Decimal('50.00'), main_image=image
+        )
+
+    def setUp(self):
+        caches['sales'].clear()
+
+    def test_repeat_hits_skip_the_database(self):
+        self.client.get(reverse('Laser_Beam_dashboard'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('Laser_Beam_dashboard'))
+        self.assertContains(response, 'Laser One')
+
+    def test_page_and_sort_are_cached_separately(self):
+        url = reverse('All_products')
+        self.client.get(url)
+        response = self.client.get(url, {'sort': 'price'})
+        self.assertEqual([p.name for p in response.context['product']], ['Smoke One', 'Laser One'])
+
+    def test_product_change_only_invalidates_its_pages(self):
+        laser_url = reverse('Laser_Beam_dashboard')
+        smoke_url = reverse('Smoke_dashboard')
+        self.client.get(laser_url)
+        self.client.get(smoke_url)
+
+        self.smoke.price = Decimal('60.00')
+        self.smoke.save()
+
+        with self.assertNumQueries(0):
+            self.client.get(laser_url)
+        self.assertContains(self.client.get(smoke_url), '60')
+
+    def test_moving_category_refreshes_both_categories(self):
+        laser_url = reverse('Laser_Beam_dashboard')
+        smoke_url = reverse('Smoke_dashboard')
+        self.client.get(laser_url)
+        self.client.get(smoke_url)
+
+        product = Product.objects.get(pk=self.laser.pk)
+        product.category = Product.Category.SMOKE
+        product.save()
+
+        self.assertNotContains(self.client.get(laser_url), 'Laser One')
+        self.assertContains(self.client.get(smoke_url), 'Laser One')
+
+    def test_evicted_version_never_revives_an_old_page(self):
+        url = reverse('Laser_Beam_dashboard')
+        self.client.get(url)
+        self.laser.name = 'Laser Two'
+        self.laser.save()
+        self.client.get(url)
+        # The cache may drop any entry, including the version keys; an update()
+        # sends no signal, so only a new version can show the new name
+        caches['sales'].delete(cache._version_key(cache.category_scope(Product.Category.LASER_BEAM)))
+        Product.objects.filter(pk=self.laser.pk).update(name='Laser Three')
+        self.assertContains(self.client.get(url), 'Laser Three')
+
+    def test_unknown_params_share_the_cached_page_and_are_not_stored(self):
+        url = reverse('Laser_Beam_dashboard')
+        self.client.get(url, {'utm_source': 'ad'})
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url, {'utm_source': 'other', 'x': '1'})
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+    def test_product_image_invalidates_the_product_page(self):
+        url = reverse('product_details_copy', kwargs={'product_id': self.laser.pk})
+        self.client.get(url)
+        ProductImage.objects.create(product=self.laser, image='products/images/new.png')
+        self.assertContains(self.client.get(url), 'products/images/new.png')
+
+
+class ReplicaLagTests(SimpleTestCase):
+    def setUp(self):
+        caches['sales'].clear()
+        patcher = mock.patch.dict(settings.DATABASES, {'replica': {}})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scope = cache.category_scope(Product.Category.SMOKE)
+
+    def reads_on_miss(self, path):
+        """Serve path through the page cache in a replica block; returns the reads the render saw"""
+        seen = []
+
+        def render():
+            seen.append(routers.current_reads())
+            return HttpResponse('page')
+
+        with routers.replica_reads():
+            cache.cached_page(RequestFactory().get(path), [self.scope], render)
+        return seen[0] if seen else None
+
+    def test_misses_right_after_a_bump_render_from_the_primary(self):
+        self.assertEqual(self.reads_on_miss('/one/'), 'replica')
+        cache.bump(self.scope)
+        self.assertEqual(self.reads_on_miss('/one/'), 'default')
+        # Once the replica has had time to catch up, misses go back to it
+        caches['sales'].delete(cache._bumped_key(self.scope))
+        cache.bump(cache.ALL)
+        self.assertEqual(self.reads_on_miss('/two/'), 'replica')
+
+    def test_cached_values_follow_the_same_rule(self):
+        cache.bump(self.scope)
+        with routers.replica_reads():
+            reads = cache.cached_value('related', [self.scope], routers.current_reads)
+        self.assertEqual(reads, 'default')
+
+
+class StaticPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        image = 'products/main_images/test.png'
+        cls.products = [
+            Product.objects.create(
+                name=f"Laser {i}", category=Product.Category.LASER_BEAM, price=Decimal('10.00'), main_image=image
+            )
+            for i in range(12)
+        ]
+        Product.objects.create(name='Smoke One', category=Product.Category.SMOKE, price=Decimal('5.00'), main_image=image)
+
+    def setUp(self):
+        caches['sales'].clear()
+
+    def test_static_pages_do_not_load_the_catalog(self):
+        for name in ('About_us', 'contact', 'services'):
+            with self.subTest(page=name), self.assertNumQueries(0):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_related_strip_is_bounded_and_same_category(self):
+        product = self.products[0]
+        response = self.client.get(reverse('product_details_copy', kwargs={'product_id': product.pk}))
+        related = response.context['related_products']
+        self.assertEqual(len(related), 8)
+        self.assertNotIn(product, related)
+        self.assertTrue(all(item.category == Product.Category.LASER_BEAM for item in related))
@@ -1,20 +1,21 @@
 from django.urls import path,include
 from . import views,models
+from manager.models import Product
 from .views import (
-    HomeView,product_details_copy,
+    HomeView,product_details_copy,CategoryCatalogView,
 )
 urlpatterns=[
     path('', HomeView.as_view(), name='Home'),
-    path('All_products/', views.All_Dash , name='All_products'),    
-    path('Moving_dashboard/', views.Moving_dashboard , name='Moving_dashboard'),
-    path('Led_par_dashboard/', views.Led_par_dashboard , name='Led_par_dashboard'),
-    path('Smoke_dashboard/', views.Smoke_dashboard , name='Smoke_dashboard'),
-    path('Controlls_dashboard/', views.Controlls_dashboard , name='Controlls_dashboard'),
-    path('Laser_Beam_dashboard/', views.Laser_Beam_dashboard , name='Laser_Beam_dashboard'),
-    path('Lamps_dashboard/', views.Lamps_dashboard , name='Lamps_dashboard'),
-    path('Truss_dashboard/', views.Truss_dashboard , name='Truss_dashboard'),
-    path('Led_Screens_dashboard/', views.Led_Screens_dashboard , name='Led_Screens_dashboard'),
-    path('Accessories_dashboard/', views.Accessories_dashboard , name='Accessories_dashboard'),
+    path('All_products/', CategoryCatalogView.as_view(), name='All_products'),
+    path('Moving_dashboard/', CategoryCatalogView.as_view(category=Product.Category.MOVING_HEAD), name='Moving_dashboard'),
+    path('Led_par_dashboard/', CategoryCatalogView.as_view(category=Product.Category.LED_PAR), name='Led_par_dashboard'),
+    path('Smoke_dashboard/', CategoryCatalogView.as_view(category=Product.Category.SMOKE), name='Smoke_dashboard'),
+    path('Controlls_dashboard/', CategoryCatalogView.as_view(category=Product.Category.CONTROLS), name='Controlls_dashboard'),
+    path('Laser_Beam_dashboard/', CategoryCatalogView.as_view(category=Product.Category.LASER_BEAM), name='Laser_Beam_dashboard'),
+    path('Lamps_dashboard/', CategoryCatalogView.as_view(category=Product.Category.LAMPS), name='Lamps_dashboard'),
+    path('Truss_dashboard/', CategoryCatalogView.as_view(category=Product.Category.TRUSS), name='Truss_dashboard'),
+    path('Led_Screens_dashboard/', CategoryCatalogView.as_view(category=Product.Category.LED_SCREENS), name='Led_Screens_dashboard'),
+    path('Accessories_dashboard/', CategoryCatalogView.as_view(category=Product.Category.ACCESSORIES), name='Accessories_dashboard'),
     path('services/', views.services , name='services'),
     path('contact/', views.contact , name='contact'),
     path('About_us/', views.About_us , name='About_us'),
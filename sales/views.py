@@ -2,6 +2,9 @@ from django.shortcuts import render, redirect, get_object_or_404
 from manager.models import Product
 from django.contrib.auth.decorators import login_required
 from django.views.generic import CreateView, UpdateView, DetailView, ListView
+from django_filters.views import FilterView
+from .filters import ProductFilter
+from .cache import ALL, CatalogCacheMixin, cache_catalog_page, cached_value, category_scope, product_scope
 
 
 #################################### Products ####################################
@@ -10,63 +13,80 @@ from django.views.generic import CreateView, UpdateView, DetailView, ListView
 
 
 
-class HomeView(ListView):
+class HomeView(CatalogCacheMixin, ListView):
     model = Product
     template_name = 'sales/home.html'  
     context_object_name = 'products'
 
 # Dashboard
-def All_Dash(request):
-    return render(request,"sales/products/All_products.html",{'product':Product.objects.all()})
-
-def Moving_dashboard(request):
-    return render(request,"sales/products/moving_head.html",{'product':Product.objects.all()})
-
-
-def Led_par_dashboard(request):
-    return render(request,"sales/products/led_par.html",{'product':Product.objects.all()})
-
-def Smoke_dashboard(request):
-    return render(request,"sales\products\smoke.html",{'product':Product.objects.all()})
-
-def Controlls_dashboard(request):
-    return render(request,"sales\products\controlls.html",{'product':Product.objects.all()})
-
-def Laser_Beam_dashboard(request):
-    return render(request,"sales\products\laser_beam.html",{'product':Product.objects.all()})
-
-def Lamps_dashboard(request):
-    return render(request,"sales\products\lamps.html",{'product':Product.objects.all()})
-
-def Truss_dashboard(request):
-    return render(request,"sales/products/truss.html",{'product':Product.objects.all()})
-    # return render(request,"sales.html",{'product':Product.objects.all()})
-
-def Led_Screens_dashboard(request):
-    return render(request,"sales\products\led_screens.html",{'product':Product.objects.all()})
-
-def Accessories_dashboard(request):
-    return render(request,"sales\products/accessories.html",{'product':Product.objects.all()})
-
-def dashboard(request):
-    return render(request,"sales\products\led_screens.html",{'product':Product.objects.all()})
-
-
+class CategoryCatalogView(CatalogCacheMixin, FilterView):
+    """Storefront catalog for one Product.Category (or the whole catalog when
+    no category is given). Filtering, sorting and pagination all happen in the
+    database, so a page only loads the products it shows. Rendered pages are
+    cached per category, page and sort until a product in them changes."""
+    model = Product
+    filterset_class = ProductFilter
+    cache_params = ('page', 'search', 'price_min', 'price_max', 'category', 'sort')
+    template_name = 'sales/products/category.html'
+    context_object_name = 'product'
+    paginate_by = 24
+    category = None
+
+    def get_cache_scopes(self):
+        return [category_scope(self.category)] if self.category else [ALL]
+
+    def get_queryset(self):
+        queryset = Product.objects.only(
+            'id', 'name', 'category', 'price', 'main_image', 'main_image_status', 'created_at'
+        ).order_by('-price', 'pk')
+        if self.category:
+            queryset = queryset.filter(category=self.category)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['category'] = self.category
+        context['category_label'] = (
+            Product.Category(self.category).label if self.category else 'All'
+        )
+        context['current_sort'] = self.request.GET.get('sort', '')
+        return context
+
+
+RELATED_PRODUCTS_LIMIT = 8
+
+
+def related_products(product):
+    """Newest products in the same category (cached per category version), minus product itself"""
+    def compute():
+        return list(
+            Product.objects.filter(category=product.category)
+            .only('id', 'name', 'category', 'main_image', 'main_image_status')
+            .order_by('-created_at', '-pk')[:RELATED_PRODUCTS_LIMIT + 1]
+        )
+    related = cached_value('related', [category_scope(product.category)], compute)
+    return [item for item in related if item.pk != product.pk][:RELATED_PRODUCTS_LIMIT]
+
+
+# The related strip can change with any product, hence ALL
+@cache_catalog_page(lambda request, product_id: [ALL, product_scope(product_id)])
 def product_details_copy(request, product_id):
     product = get_object_or_404(Product, id=product_id)
-    all_products = Product.objects.all()
     context = {
         'product': product,
-        'all_products': all_products,
+        'related_products': related_products(product),
     }
     return render(request, "sales/products/product_details_copy.html", context)
 
+# The static pages only need the base template's navigation, not the catalog
+@cache_catalog_page()
 def About_us(request):
-    return render(request,"sales/About_us.html",{'product':Product.objects.all()})
+    return render(request,"sales/About_us.html")
 
+@cache_catalog_page()
 def contact(request):
-    return render(request,"sales/contact.html",{'product':Product.objects.all()})
+    return render(request,"sales/contact.html")
 
+@cache_catalog_page()
 def services(request):
-    return render(request,"sales/services.html",{'product':Product.objects.all()})
-
+    return render(request,"sales/services.html")